@@ -0,0 +1,308 @@
+"""
+Benchmarks against a fake Joplin server. Run headless:
+
+    python -m benchmark --sizes 1000,10000 --output results.json
+    python -m benchmark --compare results.json
+
+The results are written as JSON, so that they can be compared across commits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import joppy.data_types as dt
+
+# Before importing Qt.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# pylint: disable=wrong-import-position
+from PySide6.QtCore import QSettings  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from joplin_sticky_notes import app  # noqa: E402
+from joplin_sticky_notes.api_helper import create_hierarchy  # noqa: E402
+from joplin_sticky_notes.client import Client  # noqa: E402
+from joplin_sticky_notes.hierarchy_cache import (  # noqa: E402
+    HierarchyCache,
+    refresh_cache,
+)
+from joplin_sticky_notes.note_selection import NoteSelection  # noqa: E402
+from joplin_sticky_notes.search_index import SearchIndex  # noqa: E402
+
+from .fake_joplin import FakeJoplin, generate_library  # noqa: E402
+
+
+def wait(nm):
+    """Wait for the background work and the resulting GUI updates."""
+    nm.worker.pool.waitForDone()
+    QApplication.processEvents()
+
+
+class Context:
+    """A fake Joplin and a fresh settings folder for one library size."""
+
+    def __init__(self, size: int, args):
+        self.size = size
+        self.library = generate_library(
+            notes=size,
+            depth=args.depth,
+            breadth=args.breadth,
+            resources_per_note=args.resources,
+            resource_bytes=args.resource_bytes,
+        )
+        self.server = FakeJoplin(self.library, latency=args.latency / 1000)
+        self.api = Client("token", url=self.server.url)
+        self.folder = tempfile.TemporaryDirectory()
+        QSettings.setPath(
+            QSettings.defaultFormat(), QSettings.Scope.UserScope, self.folder.name
+        )
+        self.note_managers: List[app.NoteManager] = []
+
+    def close(self):
+        for nm in self.note_managers:
+            wait(nm)
+            nm.save_timer.stop()
+            nm.core.close()
+            for window in nm.notes:
+                window.deleteLater()
+        QApplication.sendPostedEvents()
+        self.server.close()
+        self.folder.cleanup()
+
+    def note_manager(self):
+        nm = app.NoteManager()
+        nm.core.api = self.api
+        self.note_managers.append(nm)
+        wait(nm)
+        return nm
+
+
+def bench_create_hierarchy(context: Context) -> Callable[[], None]:
+    return lambda: create_hierarchy(context.api)
+
+
+def bench_refresh_cache_full(context: Context) -> Callable[[], None]:
+    path = Path(context.folder.name)
+
+    def run():
+        refresh_cache(
+            context.api,
+            HierarchyCache(path / "hierarchy.json"),
+            SearchIndex(path / "search.sqlite"),
+        )
+
+    return run
+
+
+def bench_chooser_open(context: Context) -> Callable[[], None]:
+    cache = refresh_cache(
+        context.api, HierarchyCache(Path(context.folder.name) / "hierarchy.json")
+    )
+    hierarchy, title_index = cache.hierarchy(), cache.title_index()
+
+    def run():
+        selection = NoteSelection(hierarchy, title_index, None, print)
+        QApplication.processEvents()
+        selection.close()
+
+    return run
+
+
+def bench_chooser_search(context: Context) -> Callable[[], None]:
+    path = Path(context.folder.name)
+    search_index = SearchIndex(path / "search.sqlite")
+    cache = refresh_cache(
+        context.api, HierarchyCache(path / "hierarchy.json"), search_index
+    )
+    selection = NoteSelection(
+        cache.hierarchy(), cache.title_index(), search_index, print
+    )
+
+    def run():
+        selection.search_edit.setText("project meet")
+        selection.search()
+        QApplication.processEvents()
+
+    return run
+
+
+def bench_set_note(context: Context) -> Callable[[], None]:
+    """Bind a note to a window, including the download of its resources."""
+    nm = context.note_manager()
+    nm.new_note()
+    title_bar = nm.notes[0].title_bar
+    note_ids = iter(list(context.library.notes))
+
+    def run():
+        # A different note each time, so that nothing is cached.
+        title_bar.set_note("title", next(note_ids))
+        wait(nm)
+
+    return run
+
+
+def bench_save_update_notes(context: Context) -> Callable[[], None]:
+    """One update tick with 20 open notes, one of them changed in Joplin."""
+    nm = context.note_manager()
+    note_ids = list(context.library.notes)[:20]
+    for note_id in note_ids:
+        nm.new_note(id_=note_id)
+    nm.save_update_notes()
+    wait(nm)
+    changed_ids = iter(note_ids * 100)
+
+    def run():
+        context.library.touch(next(changed_ids))
+        nm.save_update_notes()
+        wait(nm)
+
+    return run
+
+
+def bench_open_notes(context: Context) -> Callable[[], None]:
+    """Open a board of 30 notes with the same tag at once."""
+    nm = context.note_manager()
+    tag_id, note_ids = next(iter(context.library.note_tags.items()))
+    notes = iter([dt.NoteData(id=note_id, title="title") for note_id in note_ids] * 100)
+
+    def run():
+        # Different notes each time if the tag has enough, so that less is cached.
+        nm.open_notes([next(notes) for _ in range(30)], tag_ids=[tag_id])
+        wait(nm)
+
+    return run
+
+
+BENCHMARKS: Dict[str, Callable[[Context], Callable[[], None]]] = {
+    "create_hierarchy": bench_create_hierarchy,
+    "refresh_cache_full": bench_refresh_cache_full,
+    "chooser_open": bench_chooser_open,
+    "chooser_search": bench_chooser_search,
+    "set_note": bench_set_note,
+    "save_update_notes": bench_save_update_notes,
+    "open_notes": bench_open_notes,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(args) -> dict:
+    results: List[dict] = []
+    for size in args.sizes:
+        for name in args.benchmarks:
+            context = Context(size, args)
+            try:
+                run = BENCHMARKS[name](context)
+                requests_before = context.server.requests
+                durations = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    run()
+                    durations.append(time.perf_counter() - start)
+                requests = (context.server.requests - requests_before) / args.repeat
+            finally:
+                context.close()
+            results.append(
+                {
+                    "name": name,
+                    "size": size,
+                    "median": statistics.median(durations),
+                    "min": min(durations),
+                    "max": max(durations),
+                    "requests": requests,
+                }
+            )
+            print(
+                f"{name:20} {size:>7} notes: {results[-1]['median'] * 1000:9.1f} ms "
+                f"({requests:.0f} requests)",
+                file=sys.stderr,
+            )
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print the ratio of the median durations. Below 1 is faster."""
+    old_results = {(item["name"], item["size"]): item for item in old["results"]}
+    print(f"{old.get('commit', '')} -> {new.get('commit', '')}", file=sys.stderr)
+    for item in new["results"]:
+        if (old_item := old_results.get((item["name"], item["size"]))) is None:
+            continue
+        ratio = item["median"] / old_item["median"]
+        print(
+            f"{item['name']:20} {item['size']:>7} notes: {ratio:6.2f}x",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=[1000, 10000],
+        help="comma separated numbers of notes",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=lambda text: text.split(","),
+        default=list(BENCHMARKS),
+        help=f"comma separated subset of: {', '.join(BENCHMARKS)}",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=3, help="notebook tree depth")
+    parser.add_argument("--breadth", type=int, default=4, help="notebooks per level")
+    parser.add_argument("--resources", type=int, default=2, help="per note")
+    parser.add_argument("--resource-bytes", type=int, default=256 * 1024)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="per request in milliseconds"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file, else stdout")
+    parser.add_argument("--compare", type=Path, help="JSON file of an earlier run")
+    args = parser.parse_args(argv)
+    if unknown := set(args.benchmarks) - set(BENCHMARKS):
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    qt_app = QApplication.instance() or QApplication([])  # noqa: F841
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Fake Joplin data API, serving a synthetic library. Only the endpoints used by the
+app are implemented. See: https://joplinapp.org/help/api/references/rest_api/
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+WORDS = (
+    "alpha beta gamma delta project meeting shopping list recipe travel budget "
+    "ideas journal book movie garden fitness work home todo archive draft"
+).split()
+CHUNK_SIZE = 64 * 1024
+
+
+def id_(kind: int, number: int) -> str:
+    """Joplin IDs are 32 hex characters. The kind avoids collisions."""
+    return f"{kind:04x}{number:028x}"
+
+
+@dataclass
+class Library:
+    notebooks: Dict[str, dict] = field(default_factory=dict)
+    notes: Dict[str, dict] = field(default_factory=dict)
+    # The file size of a resource is given by "size".
+    resources: Dict[str, dict] = field(default_factory=dict)
+    note_resources: Dict[str, List[str]] = field(default_factory=dict)
+    tags: Dict[str, dict] = field(default_factory=dict)
+    note_tags: Dict[str, List[str]] = field(default_factory=dict)
+    events: List[dict] = field(default_factory=list)
+
+    def touch(self, note_id: str):
+        """Change a note, like an edit in Joplin."""
+        note = self.notes[note_id]
+        note["updated_time"] += 1
+        note["body"] += "\nedited"
+        self.events.append({"item_type": 1, "item_id": note_id, "type": 2})
+
+
+def generate_library(
+    notes: int = 1000,
+    depth: int = 3,
+    breadth: int = 4,
+    body_bytes: int = 1000,
+    resources_per_note: int = 0,
+    resource_bytes: int = 100 * 1024,
+    tags: int = 4,
+    seed: int = 0,
+) -> Library:
+    """
+    Create a library with a notebook tree of the given depth and breadth.
+    The notes are distributed over all notebooks and tags.
+    """
+    rng = random.Random(seed)
+    library = Library()
+
+    parents = [""]
+    for _ in range(depth):
+        children = []
+        for parent_id in parents:
+            for _ in range(breadth):
+                notebook_id = id_(1, len(library.notebooks))
+                library.notebooks[notebook_id] = {
+                    "id": notebook_id,
+                    "title": " ".join(rng.choices(WORDS, k=2)),
+                    "parent_id": parent_id,
+                    "updated_time": 1700000000000,
+                }
+                children.append(notebook_id)
+        parents = children
+    notebook_ids = list(library.notebooks)
+    for number in range(tags):
+        tag_id = id_(4, number)
+        library.tags[tag_id] = {"id": tag_id, "title": f"tag {number}"}
+        library.note_tags[tag_id] = []
+    tag_ids = list(library.tags)
+
+    for number in range(notes):
+        note_id = id_(2, number)
+        resource_ids = [
+            id_(3, number * resources_per_note + index)
+            for index in range(resources_per_note)
+        ]
+        for resource_id in resource_ids:
+            library.resources[resource_id] = {
+                "id": resource_id,
+                "size": resource_bytes,
+                "updated_time": 1700000000000,
+                "blob_updated_time": 1700000000000,
+            }
+        text = " ".join(rng.choices(WORDS, k=max(body_bytes // 6, 1)))
+        links = "\n".join(
+            f"[attachment](:/{resource_id})" for resource_id in resource_ids
+        )
+        library.notes[note_id] = {
+            "id": note_id,
+            "title": f"{' '.join(rng.choices(WORDS, k=3))} {number}",
+            "parent_id": notebook_ids[number % len(notebook_ids)],
+            "updated_time": 1700000000000,
+            "body": f"# Note {number}\n\n{text[:body_bytes]}\n\n{links}",
+        }
+        library.note_resources[note_id] = resource_ids
+        if tag_ids:
+            library.note_tags[tag_ids[number % len(tag_ids)]].append(note_id)
+    return library
+
+
+def select(item: dict, query: dict) -> dict:
+    fields = query.get("fields", ["id,parent_id,title"])[0].split(",")
+    return {key: item[key] for key in fields if key in item}
+
+
+def paginate(items: List[dict], query: dict) -> dict:
+    limit = int(query.get("limit", ["10"])[0])
+    page = int(query.get("page", ["1"])[0])
+    start = (page - 1) * limit
+    return {
+        "items": [select(item, query) for item in items[start : start + limit]],
+        "has_more": start + limit < len(items),
+    }
+
+
+class FakeJoplin(ThreadingHTTPServer):
+    """
+    Serves a library on localhost. Each request is delayed by "latency" seconds
+    to simulate a busy Joplin. The number of requests is counted.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, library: Library, latency: float = 0.0):
+        self.library = library
+        self.latency = latency
+        self.requests = 0
+        # Pagination needs lists. The items are changed in place only.
+        self.notebook_list = list(library.notebooks.values())
+        self.note_list = list(library.notes.values())
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.thread = threading.Thread(
+            target=self.serve_forever, args=(0.01,), daemon=True
+        )
+        self.thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+    def respond(self, path: str, query: dict):
+        """Returns a JSON serializable object or the size of a resource file."""
+        library = self.library
+        if path == "/ping":
+            return "JoplinClipperServer"
+        if path == "/folders":
+            return paginate(self.notebook_list, query)
+        if path == "/notes":
+            return paginate(self.note_list, query)
+        if path == "/events":
+            cursor = query.get("cursor", [None])[0]
+            if cursor is None:
+                return {"items": [], "has_more": False, "cursor": len(library.events)}
+            return {
+                "items": library.events[int(cursor) :],
+                "has_more": False,
+                "cursor": len(library.events),
+            }
+        if path == "/tags":
+            return paginate(list(library.tags.values()), query)
+        if match := re.fullmatch(r"/folders/(\w+)/notes", path):
+            notes = [note for note in self.note_list if note["parent_id"] == match[1]]
+            return paginate(notes, query)
+        if match := re.fullmatch(r"/tags/(\w+)/notes", path):
+            notes = [library.notes[note_id] for note_id in library.note_tags[match[1]]]
+            return paginate(notes, query)
+        if match := re.fullmatch(r"/notes/(\w+)", path):
+            return select(library.notes[match[1]], query)
+        if match := re.fullmatch(r"/notes/(\w+)/resources", path):
+            resources = [
+                library.resources[resource_id]
+                for resource_id in library.note_resources[match[1]]
+            ]
+            return paginate(resources, query)
+        if match := re.fullmatch(r"/resources/(\w+)/file", path):
+            return library.resources[match[1]]["size"]
+        raise KeyError(path)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Else the response body waits for the acknowledgement of the headers.
+    disable_nagle_algorithm = True
+    server: FakeJoplin
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        try:
+            data = self.server.respond(url.path, parse_qs(url.query))
+        except KeyError:
+            self.send_error(404)
+            return
+
+        if isinstance(data, int):
+            # Resource file of the given size.
+            self.send_response(200)
+            self.send_header("Content-Length", str(data))
+            self.end_headers()
+            chunk = b"\0" * CHUNK_SIZE
+            for start in range(0, data, CHUNK_SIZE):
+                self.wfile.write(chunk[: data - start])
+            return
+
+        body = (data if isinstance(data, str) else json.dumps(data)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
@@ -1,7 +1,13 @@
+import time
+
+# Before the imports, to measure them with "--profile-startup".
+STARTED = time.perf_counter()
+
+# pylint: disable=wrong-import-position
 # Use relative imports in __main__.py for pyinstaller compatibility.
 # See: https://github.com/pyinstaller/pyinstaller/issues/2560
-from joplin_sticky_notes.app import main
+from joplin_sticky_notes.cli import main  # noqa: E402
 
 
 if __name__ == "__main__":
-    main()
+    main(started=STARTED)
@@ -2,35 +2,45 @@ from __future__ import annotations
 
 from collections import defaultdict
 from dataclasses import dataclass
-import time
-from typing import List
+import re
+from typing import Dict, List, Optional, Tuple
 
 import joppy.data_types as dt
-import requests
 
+from .connection import DEFAULT_TIMEOUT, DEFAULT_URL
+from .resource_cache import ResourceCache
 
-def request_api_token():
-    # TODO: Make more robust.
 
-    try:
-        response = requests.post("http://localhost:41184/auth", timeout=5)
-        if response.status_code == 200:
-            auth_token = response.json()["auth_token"]
-        else:
-            return None
-    except requests.exceptions.ConnectionError:
-        return None
+def start_authorization(url: str = DEFAULT_URL) -> str:
+    """
+    Ask Joplin for an API token. The user has to accept the request in Joplin.
+    Returns the auth token, which identifies the request.
+    See: https://joplinapp.org/help/dev/spec/clipper_auth
+    """
+    from .client import SESSION  # pylint: disable=import-outside-toplevel
 
-    for _ in range(60):
-        response = requests.get(
-            f"http://localhost:41184/auth/check?auth_token={auth_token}", timeout=5
-        )
-        if response.status_code == 200:
-            data = response.json()
-            if data["status"] == "accepted":
-                return data["token"]
-        time.sleep(1)
-    return None
+    response = SESSION.post(f"{url}/auth", timeout=DEFAULT_TIMEOUT)
+    response.raise_for_status()
+    return response.json()["auth_token"]
+
+
+def check_authorization(
+    auth_token: str, url: str = DEFAULT_URL
+) -> Tuple[str, Optional[str]]:
+    """
+    Get the status of a token request: "waiting", "accepted" or "rejected".
+    The API token is only returned if the request was accepted.
+    """
+    from .client import SESSION  # pylint: disable=import-outside-toplevel
+
+    response = SESSION.get(
+        f"{url}/auth/check",
+        params={"auth_token": auth_token},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    response.raise_for_status()
+    data = response.json()
+    return data["status"], data.get("token")
 
 
 @dataclass
@@ -66,43 +76,104 @@ def create_notebook_tree(flat_list):
     return traverse(graph, roots)
 
 
-def create_hierarchy(api):
-    """
-    Create a notebook hierarchy (including notes and resources)
-    from a flat notebook list.
-    """
-    try:
-        # Don't use "as_tree=True", since it's undocumented and might be removed.
-        notebooks_flat_api = api.get_all_notebooks(fields="id,title,parent_id")
-    except requests.exceptions.ConnectionError:
-        return []
-    notebooks_flat_map = {notebook.id: notebook for notebook in notebooks_flat_api}
+def build_hierarchy(notebooks_flat, notes_flat):
+    """Create a notebook hierarchy from flat notebook and note lists."""
+    notebooks_flat_map = {notebook.id: notebook for notebook in notebooks_flat}
     notebook_tree_ids = create_notebook_tree(notebooks_flat_map)
 
-    item_count = defaultdict(int)
+    # Sort once here, so that the views don't need to.
+    notes_by_parent_id = defaultdict(list)
+    for note in sorted(notes_flat, key=lambda note: note.title or ""):
+        notes_by_parent_id[note.parent_id].append(note)
 
     def replace_ids_by_items(id_tree):
         item_tree = []
         for key, value in id_tree.items():
-            item_count["notebooks"] += 1
-            child_notes = api.get_all_notes(notebook_id=key, fields="id,title")
             # child_resources = []
             # for note in child_notes:
             #    child_resources.extend(
             #        api.get_all_resources(note_id=note.id, fields="id,title")
             #    )
-
-            item_count["notes"] += len(child_notes)
-            # item_count["resources"] += len(child_resources)
             item_tree.append(
                 TreeItem(
                     notebooks_flat_map[key],
                     replace_ids_by_items(value),
-                    child_notes,
+                    notes_by_parent_id[key],
                     # child_resources,
                 )
             )
-        return item_tree
+        return sorted(item_tree, key=lambda item: item.data.title or "")
 
     notebook_tree_items = replace_ids_by_items(notebook_tree_ids)
     return notebook_tree_items
+
+
+def create_hierarchy(api):
+    """
+    Create a notebook hierarchy (including notes and resources)
+    from a flat notebook list.
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    try:
+        # Don't use "as_tree=True", since it's undocumented and might be removed.
+        notebooks_flat_api = api.get_all_notebooks(
+            fields="id,title,parent_id", limit=100
+        )
+        # Get all notes at once instead of one request per notebook.
+        notes_flat_api = api.get_all_notes(fields="id,title,parent_id", limit=100)
+    except requests.exceptions.ConnectionError:
+        return []
+    return build_hierarchy(notebooks_flat_api, notes_flat_api)
+
+
+# Joplin links resources by ":/<32 hex digits ID>".
+RESOURCE_LINK = re.compile(r":/([0-9a-fA-F]{32})")
+
+
+def replace_resource_links(body: str, resource_files: Dict[str, str]) -> str:
+    """Replace Joplin's local resource links in a single pass."""
+    return RESOURCE_LINK.sub(
+        lambda match: resource_files.get(match.group(1), match.group(0)), body
+    )
+
+
+@dataclass
+class NoteBody:
+    """Markdown body with local resource links and the version of the resources."""
+
+    markdown: str
+    resource_version: str
+
+
+def get_note_body(
+    api, note_id: str, resource_cache: ResourceCache, note_body=None, progress=None
+) -> NoteBody:
+    """
+    Get the markdown body of a note and download the attached resources.
+    Joplin's local resource links are replaced by the paths of the downloaded files.
+    While resources are downloaded, "progress" is called with the body and the
+    number of finished and total downloads. So the text can be shown already.
+    """
+    if note_body is None:
+        note_body = api.get_note(note_id, fields="body").body
+
+    resources = api.get_all_resources(
+        note_id=note_id, fields="id,updated_time,blob_updated_time"
+    )
+    resource_ids = [resource.id for resource in resources]
+    body_markdown = replace_resource_links(
+        note_body,
+        {id_: str(resource_cache.file(id_)) for id_ in resource_ids},
+    )
+    resource_cache.set_note_resources(note_id, resource_ids)
+
+    def on_downloaded(downloaded, total):
+        if progress is not None:
+            body = NoteBody(body_markdown, resource_cache.version(resource_ids))
+            progress((body, downloaded, total))
+
+    resource_cache.get_all(api, resources, on_downloaded)
+    resource_cache.evict(keep=resource_ids)
+    resource_cache.save()
+    return NoteBody(body_markdown, resource_cache.version(resource_ids))
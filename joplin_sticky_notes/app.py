@@ -1,14 +1,16 @@
 # pylint: disable=no-name-in-module,missing-function-docstring
+import functools
+import math
 import os
 from pathlib import Path
-import subprocess
 import sys
+import time
+import traceback
+from typing import List, Optional
+import uuid
 
-from joppy.api import Api
-from markdown import Markdown
 from PySide6.QtWidgets import (
     QApplication,
-    QTextBrowser,
     QWidget,
     QSystemTrayIcon,
     QMenu,
@@ -24,12 +26,97 @@ from PySide6.QtWidgets import (
     QStyle,
     QMessageBox,
 )
-from PySide6.QtCore import Qt, QRect, QSettings, QTimer, QUrl
-from PySide6.QtGui import QAction, QCursor, QIcon, QDesktopServices
-import requests
+from PySide6.QtCore import Qt, QRect, QSettings, QSize, QTimer, QUrl, Signal
+from PySide6.QtGui import QAction, QCursor, QDesktopServices, QGuiApplication, QIcon
+
+from .api_helper import TreeItem
+from .connection import ConnectionState, DEFAULT_TIMEOUT
+from .core import Core
+from .diagnostics import DiagnosticsWindow
+from .document_patch import update_html
+from .hierarchy_cache import TitleIndex
+from .instrumentation import (
+    enable_from_environment,
+    RECORDER,
+    span,
+    StartupProfile,
+    trace_path_from_environment,
+)
+from .note_selection import Choice, MultiNoteSelection, NoteSelection
+from .storage import StoredNote
+from .thumbnails import ImageBrowser, ThumbnailCache
+from .token_request import TokenRequest, TokenState
+from .worker import Worker
+from .x11 import forget_skip_taskbar, skip_taskbar
+
+
+# Milliseconds between updates. Longer if changes are pushed.
+POLL_INTERVAL = 5000
+PUSH_POLL_INTERVAL = 60000
+# Size of new notes. Tiled notes are scaled down to fit the screen, but not
+# below the minimum scale.
+NOTE_SIZE = QSize(400, 300)
+MIN_TILE_SCALE = 0.5
+TILE_SPACING = 10
+note_hierarchy: List[TreeItem] = []
+note_index = TitleIndex([])
+
+
+def set_note_hierarchy(hierarchy, title_index):
+    global note_hierarchy
+    global note_index
+    note_hierarchy = hierarchy
+    note_index = title_index
+
+
+def tile(count: int, area: QRect) -> List[QRect]:
+    """
+    Geometries of windows in a grid that fills the area. The windows are
+    scaled down to fit. If they are too many, the remaining windows start
+    again at the top left, slightly shifted.
+    """
+
+    def scale_to_fit(columns):
+        rows = math.ceil(count / columns)
+        width = (area.width() - (columns - 1) * TILE_SPACING) / columns
+        height = (area.height() - (rows - 1) * TILE_SPACING) / rows
+        return min(width / NOTE_SIZE.width(), height / NOTE_SIZE.height(), 1.0)
+
+    scale = max([MIN_TILE_SCALE] + [scale_to_fit(c) for c in range(1, count + 1)])
+    width, height = int(NOTE_SIZE.width() * scale), int(NOTE_SIZE.height() * scale)
+    columns = max((area.width() + TILE_SPACING) // (width + TILE_SPACING), 1)
+    rows = max((area.height() + TILE_SPACING) // (height + TILE_SPACING), 1)
+
+    geometries = []
+    for index in range(count):
+        layer, position = divmod(index, columns * rows)
+        row, column = divmod(position, columns)
+        offset = layer * 2 * TILE_SPACING
+        geometries.append(
+            QRect(
+                area.x() + column * (width + TILE_SPACING) + offset,
+                area.y() + row * (height + TILE_SPACING) + offset,
+                width,
+                height,
+            )
+        )
+    return geometries
+
+
+def is_connection_error(error) -> bool:
+    import requests  # pylint: disable=import-outside-toplevel
+
+    return isinstance(error, requests.exceptions.ConnectionError)
+
+
+def on_connection_error(error):
+    if not is_connection_error(error):
+        traceback.print_exception(error)
+        return
+    from .client import CircuitOpenError  # pylint: disable=import-outside-toplevel
 
-from .api_helper import create_hierarchy, request_api_token
-from .note_selection import NoteSelection
+    if not isinstance(error, CircuitOpenError):  # Else known to be unreachable.
+        print("ConnectionError during update. Trying again next time.")
 
 
 class NoteManager:
@@ -38,22 +125,92 @@ class NoteManager:
         self.settings = QSettings("joplin-sticky-notes", "joplin-sticky-notes")
 
         self.notes = []
-        self.md = Markdown(extensions=["nl2br", "sane_lists", "tables"])
-        self.resource_path = Path(self.settings.fileName()).parent / "resources"
-        self.resource_path.mkdir(exist_ok=True, parents=True)
+        # Caches, storage and the connection to Joplin, without user interface.
+        self.core = Core.from_settings(self.settings)
+        self.thumbnails = ThumbnailCache(
+            self.core.path / "thumbnails", self.core.resource_cache.path
+        )
+        self.worker = Worker()
+        self.note_selection = None
+
+        # Save changed notes only, at most once per second.
+        self.save_timer = QTimer()
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(1000)
+        self.save_timer.timeout.connect(self.save_notes)
+
+        if self.core.store.is_empty():
+            self.migrate_settings()
+        # Hidden notes are only turned into windows when they are shown.
+        self.hidden_notes = []
+        for stored_note in self.core.store.load():
+            if stored_note.visible:
+                self.materialize(stored_note)
+            else:
+                self.hidden_notes.append(stored_note)
+        self.saved_uids = self.uids()
+        for window in self.notes:
+            window.dirty = False
+        self.collect_resource_garbage()
+
+    def uids(self):
+        return {window.uid for window in self.notes} | {
+            stored_note.uid for stored_note in self.hidden_notes
+        }
+
+    def joplin_ids(self):
+        """IDs of the Joplin notes, including the hidden notes."""
+        return {
+            note.joplin_id
+            for note in self.notes + self.hidden_notes
+            if note.joplin_id is not None
+        }
+
+    def materialize(self, stored_note):
+        """Create a window from a stored note."""
+        # Joplin notes are restored from the render cache, if possible.
+        render_key = stored_note.render_key
+        content = None if render_key is None else self.core.renderer.load(render_key)
+        if content is None:
+            render_key = None
+            content = stored_note.content or ""
+        self.new_note(
+            geometry=QRect(*stored_note.geometry),
+            body_visible=stored_note.body_visible,
+            title=stored_note.title,
+            content=content,
+            id_=stored_note.joplin_id,
+            render_key=render_key,
+            uid=stored_note.uid,
+        )
 
+    def show_hidden_notes(self):
+        hidden_notes = self.hidden_notes
+        self.hidden_notes = []
+        for stored_note in hidden_notes:
+            self.materialize(stored_note)
+
+    def migrate_settings(self):
+        """Move the notes from the settings to the database. Only needed once."""
+        stored_notes = []
         for index in range(self.settings.beginReadArray("notes")):
             self.settings.setArrayIndex(index)
-            self.new_note(
-                geometry=self.settings.value("geometry"),
-                # QSettings seems to not support bool properly.
-                body_visible=self.settings.value("body_visible")
-                in ("true", "True", True),
-                title=self.settings.value("title"),
-                content=self.settings.value("content"),
-                id_=self.settings.value("id"),
+            geometry = self.settings.value("geometry")
+            stored_notes.append(
+                StoredNote(
+                    uuid.uuid4().hex,
+                    (geometry.x(), geometry.y(), geometry.width(), geometry.height()),
+                    # QSettings seems to not support bool properly.
+                    self.settings.value("body_visible") in ("true", "True", True),
+                    self.settings.value("title"),
+                    self.settings.value("id"),
+                    self.settings.value("render_key"),
+                    self.settings.value("content"),
+                )
             )
         self.settings.endArray()
+        self.core.store.save(stored_notes)
+        self.settings.remove("notes")
 
     def new_note(
         self,
@@ -63,78 +220,357 @@ class NoteManager:
         title="New Note",
         content="",
         id_=None,
+        render_key=None,
+        uid=None,
     ):
-        window = NoteWindow(id_, self)
-        window.title_bar.info_id.setText(f"ID: {window.joplin_id}")
-        window.setGeometry(geometry)
-        window.note_body.setVisible(body_visible)
-        window.grip.setVisible(body_visible)
-        window.title_bar.label.setText(title)
-        window.note_body.setHtml(content)
-        window.show()
+        with span("window.create"):
+            window = NoteWindow(id_, self)
+            window.render_key = render_key
+            if uid is not None:
+                window.uid = uid
+            window.setGeometry(geometry)
+            window.note_body.setVisible(body_visible)
+            window.grip.setVisible(body_visible)
+            window.title_bar.label.setText(title)
+            with span("render.set_html"):
+                window.note_body.setHtml(content)
+            window.show()
         window.activateWindow()
         window.raise_()
 
         # Identify by window, since the windows can have the same title or id.
         self.notes.append(window)
+        window.mark_dirty()
+        return window
+
+    def update_open_notes(self):
+        self.core.resource_cache.set_open_notes(self.joplin_ids())
+
+    def collect_resource_garbage(self):
+        """Remove the resources that aren't used by any note anymore."""
+        self.update_open_notes()
+        self.worker.submit("resources", self.core.resource_cache.collect_garbage)
+        self.worker.submit("thumbnails", self.thumbnails.collect_garbage)
+
+    def load_hierarchy(self, on_error=on_connection_error):
+        """Load the cached hierarchy and refresh it afterwards."""
+
+        def on_loaded(result):
+            self.on_hierarchy_loaded(result)
+            self.refresh_hierarchy(on_error)
+
+        # Separate keys, so that a running refresh doesn't swallow the read.
+        self.worker.submit(
+            "hierarchy.read", self.core.read_hierarchy, on_result=on_loaded
+        )
+
+    def refresh_hierarchy(self, on_error=on_connection_error):
+        # Refresh as soon as Joplin is reachable again.
+        self.core.store.enqueue("hierarchy")
+        if self.core.api is None:
+            return
+
+        def on_refreshed(result):
+            self.core.store.complete("hierarchy")
+            self.on_hierarchy_loaded(result)
+
+        self.worker.submit(
+            "hierarchy.refresh",
+            self.core.refresh_hierarchy,
+            on_result=on_refreshed,
+            on_error=lambda error: self.on_operation_failed(
+                "hierarchy", "", error, on_error
+            ),
+        )
+
+    def choose_note(self, on_chosen, parent=None):
+        """Show the note chooser. The cached hierarchy is refreshed meanwhile."""
+        # Keep a reference, since the chooser of the tray has no parent.
+        self.note_selection = NoteSelection(
+            note_hierarchy, note_index, self.core.search_index, on_chosen, parent
+        )
+        self.refresh_hierarchy()
+
+    def find_note(self):
+        """Search a note and open it in a new window."""
+
+        def on_chosen(note_title, note_id):
+            window = self.new_note(title=note_title)
+            window.title_bar.set_note(note_title, note_id)
+
+        self.choose_note(on_chosen)
+
+    def choose_notes(self):
+        """Choose many notes and open them in new windows at once."""
+        self.note_selection = selection = MultiNoteSelection(
+            note_hierarchy, note_index, self.core.search_index, self.open_choice
+        )
+        self.refresh_hierarchy()
+        if self.core.api is not None:
+            self.worker.submit(
+                "tags",
+                self.core.tags,
+                on_result=selection.set_tags,
+                on_error=on_connection_error,
+            )
+            # The chooser may be closed before the tags arrive.
+            selection.destroyed.connect(lambda: self.worker.cancel("tags"))
+
+    def open_choice(self, choice: Choice):
+        if choice.tag_id is None:
+            self.open_notes(choice.notes, notebook_ids=choice.notebook_ids)
+            return
+        if self.core.api is None:
+            return
+        tag_id = choice.tag_id
+        self.worker.submit(
+            ("tag", tag_id),
+            self.core.tag_notes,
+            tag_id,
+            on_result=lambda notes: self.open_notes(notes, tag_ids=[tag_id]),
+            on_error=on_connection_error,
+        )
+
+    def open_notes(self, notes, notebook_ids=(), tag_ids=()):
+        """
+        Open the notes in new windows, which are tiled on the screen. The notes
+        are fetched together.
+        """
+        area = QGuiApplication.primaryScreen().availableGeometry()
+        for note, geometry in zip(notes, tile(len(notes), area)):
+            self.new_note(geometry=geometry, title=note.title, id_=note.id)
+        self.update_open_notes()
+        self.fetch_notes(
+            [note.id for note in notes], notebook_ids=notebook_ids, tag_ids=tag_ids
+        )
+
+    def on_hierarchy_loaded(self, result):
+        self.core.hierarchy_cache, hierarchy, title_index = result
+        set_note_hierarchy(hierarchy, title_index)
+
+    def update_notes(self):
+        """Update only the notes that changed in Joplin since the last update."""
+        # Skip the update if the previous one is still running.
+        if self.core.api is None or self.worker.is_running("update"):
+            return
+        # Pause polling while Joplin is unreachable. It's resumed after the backoff.
+        if not self.core.is_online():
+            return
+
+        self.worker.submit(
+            "update",
+            self.core.updated_notes,
+            self.settings.value("sync_cursor"),
+            self.joplin_ids(),
+            on_result=self.on_notes_updated,
+            on_error=on_connection_error,
+        )
+
+    def fetch_note(self, note_id, on_progress=None):
+        """Fetch a note and show it in all windows. Retried until it succeeds."""
+        self.core.store.enqueue("note", note_id)
+        if self.core.api is None:
+            return
+
+        def on_fetched(note):
+            self.core.store.complete("note", note_id)
+            self.show_notes({note_id: note})
+
+        self.worker.submit(
+            ("note", note_id),
+            self.core.fetch_note,
+            note_id,
+            on_result=on_fetched,
+            on_error=lambda error: self.on_operation_failed("note", note_id, error),
+            on_progress=on_progress,
+        )
+
+    def fetch_notes(self, note_ids, notebook_ids=(), tag_ids=()):
+        """
+        Fetch many notes in a single operation. Each note is shown as soon as
+        it's complete. The notes that failed because Joplin isn't reachable are
+        fetched one by one later.
+        """
+        for note_id in note_ids:
+            self.core.store.enqueue("note", note_id)
+        if self.core.api is None:
+            return
+
+        def on_progress(result):
+            note_id, note = result
+            self.core.store.complete("note", note_id)
+            self.show_notes({note_id: note})
+
+        def on_fetched(result):
+            _, errors = result
+            for note_id in note_ids:
+                if is_connection_error(errors.get(note_id)):
+                    self.core.store.postpone("note", note_id)
+                else:
+                    # Fetched, deleted or broken. Retrying doesn't help.
+                    self.core.store.complete("note", note_id)
+            # Report the failure once, not for every note.
+            if errors:
+                on_connection_error(next(iter(errors.values())))
+
+        def on_error(error):
+            # The notebooks or tags couldn't be listed. No note was fetched.
+            for note_id in note_ids:
+                if is_connection_error(error):
+                    self.core.store.postpone("note", note_id)
+                else:
+                    self.core.store.complete("note", note_id)
+            on_connection_error(error)
+
+        self.worker.submit(
+            ("notes", tuple(note_ids)),
+            self.core.fetch_notes,
+            note_ids,
+            notebook_ids=notebook_ids,
+            tag_ids=tag_ids,
+            on_result=on_fetched,
+            on_error=on_error,
+            on_progress=on_progress,
+        )
+
+    def on_operation_failed(self, kind, key, error, on_error=on_connection_error):
+        if is_connection_error(error):
+            self.core.store.postpone(kind, key)
+        else:
+            # For example, the note was deleted. Retrying doesn't help.
+            self.core.store.complete(kind, key)
+        on_error(error)
+
+    def replay_operations(self):
+        """Retry the due operations that failed while Joplin was unreachable."""
+        if not self.core.is_online():
+            return
+        joplin_ids = self.joplin_ids()
+        for operation in self.core.store.pending(time.time()):
+            if operation.kind == "hierarchy":
+                self.refresh_hierarchy()
+            elif operation.kind == "note":
+                if operation.key in joplin_ids:
+                    self.fetch_note(operation.key)
+                else:
+                    # The note was closed in the meantime.
+                    self.core.store.complete("note", operation.key)
+
+    def on_notes_pushed(self, note_ids):
+        """Fetch the displayed notes that changed in Joplin right away."""
+        for note_id in note_ids & self.joplin_ids():
+            self.fetch_note(note_id)
+
+    def show_notes(self, notes):
+        """Show the new title and body of the notes. Keyed by Joplin ID."""
+        for window in self.notes:
+            if (note := notes.get(window.joplin_id)) is not None:
+                window.title_bar.show_note(*note, window.joplin_id)
+
+        # Hidden notes are only rendered, so that they are up to date when shown.
+        changed_hidden_notes = []
+        for stored_note in self.hidden_notes:
+            if (note := notes.get(stored_note.joplin_id)) is not None:
+                self.core.render_stored_note(stored_note, note)
+                changed_hidden_notes.append(stored_note)
+        if changed_hidden_notes:
+            self.core.store.save(changed_hidden_notes)
+
+    def on_notes_updated(self, result):
+        cursor, notes = result
+        self.show_notes(notes)
+        self.settings.setValue("sync_cursor", cursor)
 
     def save_update_notes(self):
-        self.settings.beginWriteArray("notes", size=len(self.notes))
-        for index, window in enumerate(self.notes):
-            # update
-            if window.joplin_id is not None:
-                try:
-                    note = joplin_api.get_note(window.joplin_id, fields="title")
-                    window.title_bar.set_note(note.title, window.joplin_id)
-                except requests.exceptions.ConnectionError:
-                    print("ConnectionError during update. Trying again next time.")
-
-            # save
-            self.settings.setArrayIndex(index)
-            self.settings.setValue("geometry", window.geometry())
-            self.settings.setValue("body_visible", window.note_body.isVisible())
-            self.settings.setValue("title", window.title_bar.label.text())
-            self.settings.setValue("content", window.note_body.toHtml())
-            self.settings.setValue("id", window.joplin_id)
-        self.settings.endArray()
+        self.replay_operations()
+        self.update_notes()
+        self.save_notes()
+
+    def schedule_save(self):
+        # Restarting the timer merges changes in quick succession.
+        self.save_timer.start()
+
+    def save_notes(self):
+        """Save only the notes that changed since the last save."""
+        uids = self.uids()
+        if closed_uids := self.saved_uids - uids:
+            self.core.store.delete(closed_uids)
+        if dirty_windows := [window for window in self.notes if window.dirty]:
+            self.core.store.save(self.stored_note(window) for window in dirty_windows)
+            self.core.renderer.collect_garbage(
+                note.render_key for note in self.notes + self.hidden_notes
+            )
+        for window in dirty_windows:
+            window.dirty = False
+        self.saved_uids = uids
 
+    def stored_note(self, window):
+        geometry = window.geometry()
+        # The render key is much smaller than the HTML of the whole document.
+        if window.render_key is not None and self.core.renderer.store(
+            window.render_key
+        ):
+            render_key, content = window.render_key, None
+        else:
+            render_key, content = None, window.note_body.toHtml()
+        return StoredNote(
+            window.uid,
+            (geometry.x(), geometry.y(), geometry.width(), geometry.height()),
+            # Don't use "isVisible()". It's false if the window is hidden.
+            not window.note_body.isHidden(),
+            window.title_bar.label.text(),
+            window.joplin_id,
+            render_key,
+            content,
+            not window.isHidden(),
+        )
 
-class TitleBar(QWidget):
-    def __init__(self, parent):
-        super().__init__()
-        self.parent = parent
 
-        self.layout = QHBoxLayout()
-        self.layout.setSizeConstraint(QLayout.SetDefaultConstraint)
-        self.layout.setContentsMargins(0, 0, 0, 0)
+@functools.lru_cache(maxsize=None)
+def standard_icon(pixmap):
+    """Load the icons only once, since they are the same for all notes."""
+    return QApplication.style().standardIcon(pixmap)
 
-        # note title
-        self.label = QLabel("New Note")
-        self.label.setAlignment(Qt.AlignCenter)
-        self.layout.addWidget(self.label)
 
-        # configure menu
-        self.configure_menu = QMenu()
+class NoteMenu(QMenu):
+    """
+    Configuration menu of the notes. There is only one instance, which is
+    shared by all notes. The actions are applied to the current target.
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.target = None
 
-        self.hide = QAction("Hide")
-        self.hide.triggered.connect(self.parent.hide)
-        self.configure_menu.addAction(self.hide)
+        self.hide_note = QAction("Hide")
+        self.hide_note.triggered.connect(lambda: self.target.parent.hide())
+        self.addAction(self.hide_note)
 
         self.toggle_body = QAction("Toggle Body")
-        self.toggle_body.triggered.connect(self.on_toggle_body_clicked)
-        self.configure_menu.addAction(self.toggle_body)
+        self.toggle_body.triggered.connect(lambda: self.target.on_toggle_body_clicked())
+        self.addAction(self.toggle_body)
 
         self.choose_note = QAction("Choose Joplin Note")
-        self.choose_note.triggered.connect(self.on_choose_note_clicked)
-        self.configure_menu.addAction(self.choose_note)
+        self.choose_note.triggered.connect(lambda: self.target.on_choose_note_clicked())
+        self.addAction(self.choose_note)
 
-        self.update = QAction("Update")
-        self.update.triggered.connect(self.on_update_hierarchy_clicked)
-        self.configure_menu.addAction(self.update)
+        self.update_hierarchy = QAction("Update")
+        self.update_hierarchy.triggered.connect(
+            lambda: self.target.on_update_hierarchy_clicked()
+        )
+        self.addAction(self.update_hierarchy)
 
         self.open_joplin = QAction("Open in Joplin")
-        self.open_joplin.triggered.connect(self.on_open_joplin_clicked)
-        self.configure_menu.addAction(self.open_joplin)
+        self.open_joplin.triggered.connect(lambda: self.target.on_open_joplin_clicked())
+        self.addAction(self.open_joplin)
 
         self.information_menu = QMenu("Information")
         self.info_parent = QAction("Parent")
@@ -149,34 +585,71 @@ class TitleBar(QWidget):
         self.info_due = QAction("Due")
         self.info_due.setEnabled(False)
         self.information_menu.addAction(self.info_due)
-        self.configure_menu.addMenu(self.information_menu)
+        self.addMenu(self.information_menu)
+
+    def set_target(self, title_bar):
+        self.target = title_bar
+        self.info_id.setText(f"ID: {title_bar.parent.joplin_id}")
+
+
+class ConfigureButton(QToolButton):
+    def __init__(self, title_bar):
+        super().__init__()
+        self.title_bar = title_bar
+        # Both, the default action and the menu, are applied to this note. The
+        # default action is triggered by the mouse or the keyboard.
+        self.pressed.connect(self.set_target)
+
+    def set_target(self):
+        NoteMenu.instance().set_target(self.title_bar)
+
+    def mousePressEvent(self, event):  # pylint: disable=invalid-name
+        # The menu arrow shows the menu without emitting "pressed".
+        self.set_target()
+        super().mousePressEvent(event)
+
+
+class TitleBar(QWidget):
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+        self.layout = QHBoxLayout()
+        self.layout.setSizeConstraint(QLayout.SetDefaultConstraint)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+
+        # note title
+        self.label = QLabel("New Note")
+        self.label.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.label)
 
         # configure button
-        self.configure_button = QToolButton()
-        self.configure_button.setDefaultAction(self.choose_note)
-        configure_pixmap = QStyle.StandardPixmap.SP_FileDialogDetailedView
-        configure_icon = self.style().standardIcon(configure_pixmap)
-        self.configure_button.setIcon(configure_icon)
+        # The menu is shared by all notes. It's retargeted when the button is pressed.
+        self.configure_button = ConfigureButton(self)
+        self.configure_button.setDefaultAction(NoteMenu.instance().choose_note)
+        self.configure_button.setIcon(
+            standard_icon(QStyle.StandardPixmap.SP_FileDialogDetailedView)
+        )
         self.configure_button.setPopupMode(QToolButton.MenuButtonPopup)
-        self.configure_button.setMenu(self.configure_menu)
+        self.configure_button.setMenu(NoteMenu.instance())
         self.layout.addWidget(self.configure_button)
 
         # clone button
         self.clone_button = QPushButton()
         size_policy = QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         self.clone_button.setSizePolicy(size_policy)
-        clone_pixmap = QStyle.StandardPixmap.SP_TitleBarNormalButton
-        clone_icon = self.style().standardIcon(clone_pixmap)
-        self.clone_button.setIcon(clone_icon)
+        self.clone_button.setIcon(
+            standard_icon(QStyle.StandardPixmap.SP_TitleBarNormalButton)
+        )
         self.clone_button.setToolTip("Clone Note")
         self.layout.addWidget(self.clone_button)
 
         # delete button
         self.delete_button = QPushButton()
         self.delete_button.setSizePolicy(size_policy)
-        delete_pixmap = QStyle.StandardPixmap.SP_TitleBarCloseButton
-        delete_icon = self.style().standardIcon(delete_pixmap)
-        self.delete_button.setIcon(delete_icon)
+        self.delete_button.setIcon(
+            standard_icon(QStyle.StandardPixmap.SP_TitleBarCloseButton)
+        )
         self.delete_button.setToolTip("Delete Note")
         self.layout.addWidget(self.delete_button)
 
@@ -205,6 +678,7 @@ class TitleBar(QWidget):
 
         # TODO: look for clean solution
         self.parent.resize(width_before, new_height)
+        self.parent.mark_dirty()
 
     def on_clone_clicked(self):
         window = self.window()
@@ -217,11 +691,14 @@ class TitleBar(QWidget):
             title=window.title_bar.label.text(),
             content=window.note_body.toHtml(),
             id_=window.joplin_id,
+            render_key=window.render_key,
         )
 
     def on_close_clicked(self):
         self.parent.nm.notes.remove(self.parent)
         self.parent.close()
+        self.parent.nm.collect_resource_garbage()
+        self.parent.nm.schedule_save()
 
     def open_note_in_joplin(self):
         # https://joplinapp.org/help/apps/external_links
@@ -236,38 +713,63 @@ class TitleBar(QWidget):
         self.open_note_in_joplin()
 
     def on_choose_note_clicked(self):
-        NoteSelection(note_hierarchy, self)
+        self.parent.nm.choose_note(self.set_note, self)
 
     def set_note(self, note_title, note_id):
-        # get the note
-        joplin_note = joplin_api.get_note(note_id, fields="body")
         self.parent.joplin_id = note_id
+        self.parent.nm.update_open_notes()
+        self.parent.mark_dirty()
+        self.label.setText(note_title)
 
-        # get attached resources
-        body_markdown = joplin_note.body
-        resources = joplin_api.get_all_resources(note_id=note_id, fields="id")
-        for resource in resources:
-            if not Path(resource.id).exists():
-                resource_binary = joplin_api.get_resource_file(resource.id)
-                with open(self.parent.nm.resource_path / resource.id, "wb") as outfile:
-                    outfile.write(resource_binary)
-            # Replace joplin's local link with the path to the just downloaded resource.
-            body_markdown = body_markdown.replace(
-                f":/{resource.id}", str(self.parent.nm.resource_path / resource.id)
+        def on_progress(progress):
+            # Show the text already, while the resources are downloaded.
+            body, downloaded, total = progress
+            self.show_note(
+                note_title,
+                body,
+                note_id,
+                status=f"Downloading resources ({downloaded}/{total})",
             )
 
-        # convert note to html, since resources are not displayed when using
-        # setMarkdown(). See: https://forum.qt.io/post/461601
-        body_html = self.parent.nm.md.convert(body_markdown)
+        # Clones share the note, so it is only fetched once. If Joplin isn't
+        # reachable, the note is fetched later.
+        self.parent.nm.fetch_note(note_id, on_progress=on_progress)
+
+    def show_note(self, note_title, body, note_id, status=""):
+        # Another note may have been chosen in the meantime.
+        if self.parent.joplin_id != note_id:
+            return
+
+        # The status is transient. It isn't part of the saved title.
+        self.label.setToolTip(status)
 
         # update ui
-        self.label.setText(note_title)
-        self.parent.note_body.setHtml(body_html)
-        self.info_id.setText(f"ID: {note_id}")
+        if self.label.text() != note_title:
+            self.label.setText(note_title)
+            self.parent.mark_dirty()
+
+        # Unchanged content doesn't need to be converted and displayed again.
+        render_key = self.parent.nm.core.renderer.key(body)
+        if self.parent.render_key == render_key:
+            return
+
+        # convert note to html, since resources are not displayed when using
+        # setMarkdown(). See: https://forum.qt.io/post/461601
+        # Only the changed blocks are replaced, so that refreshes don't flicker.
+        body_html = self.parent.nm.core.renderer.render(body, render_key)
+        # Downloaded or changed resources keep their paths. They are only loaded
+        # again by a new document.
+        update_html(
+            self.parent.note_body,
+            body_html,
+            reload_resources=self.parent.resource_version != body.resource_version,
+        )
+        self.parent.render_key = render_key
+        self.parent.resource_version = body.resource_version
+        self.parent.mark_dirty()
 
     def on_update_hierarchy_clicked(self):
-        global note_hierarchy
-        note_hierarchy = create_hierarchy(joplin_api)
+        self.parent.nm.refresh_hierarchy()
 
 
 class NoteWindow(QFrame):
@@ -291,7 +793,8 @@ class NoteWindow(QFrame):
         self.layout.addWidget(self.title_bar)
 
         # note body
-        self.note_body = QTextBrowser()
+        # Images are shown downscaled to the width of the window.
+        self.note_body = ImageBrowser(note_manager.thumbnails)
         # Open the links manually, because else PDF files are opened inside the
         # QTextBrowser and it would crash.
         self.note_body.setOpenLinks(False)
@@ -316,22 +819,25 @@ class NoteWindow(QFrame):
 
         # some joplin specific infos
         self.joplin_id = joplin_id
+        # identifies the displayed content
+        self.render_key = None
+        # identifies the loaded resources, if known
+        self.resource_version = None
+
+        # identifies the note in the storage
+        self.uid = uuid.uuid4().hex
+        # whether the note needs to be saved
+        self.dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+        self.nm.schedule_save()
 
     def show(self):
         # don't show in taskbar
-        try:
-            # Workaround to get multiple windows without task bar on X11.
-            # See: https://stackoverflow.com/a/75584018/7410886
-            # fmt: off
-            subprocess.check_call([
-                "xprop",
-                "-f", "_NET_WM_STATE", "32a",
-                "-id", str(self.winId()),
-                "-set", "_NET_WM_STATE", "_NET_WM_STATE_SKIP_TASKBAR",
-            ])
-            # fmt: on
-        except FileNotFoundError:
-            pass  # Probably on windows/mac.
+        # On windows/mac, the window flags are sufficient.
+        if QGuiApplication.platformName() == "xcb":
+            skip_taskbar(int(self.winId()))
 
         super().show()
 
@@ -347,6 +853,18 @@ class NoteWindow(QFrame):
         )
         # Reset click position to avoid unwanted moving after resizing on windows.
         self.click_pos = None
+        self.mark_dirty()
+
+    def moveEvent(self, event):  # pylint: disable=invalid-name
+        self.mark_dirty()
+
+    def showEvent(self, event):  # pylint: disable=invalid-name
+        self.mark_dirty()
+
+    def hideEvent(self, event):  # pylint: disable=invalid-name
+        if QGuiApplication.platformName() == "xcb":
+            forget_skip_taskbar(int(self.winId()))
+        self.mark_dirty()
 
     def mousePressEvent(self, event):  # pylint: disable=invalid-name
         if event.button() == Qt.LeftButton:
@@ -358,6 +876,9 @@ class NoteWindow(QFrame):
 
 
 class Tray(QSystemTrayIcon):
+    # Emitted from any thread, but handled in the main thread.
+    connection_state_changed = Signal(object)
+
     def __init__(self, parent, note_manager):
         super().__init__(parent)
 
@@ -375,15 +896,27 @@ class Tray(QSystemTrayIcon):
         self.tray_menu = QMenu()
 
         # joplin status
-        # self.joplin_status = QAction("Joplin Status: Not Connected")
-        # self.joplin_status.setEnabled(False)
-        # self.tray_menu.addAction(self.joplin_status)
+        self.joplin_status = QAction()
+        self.joplin_status.setEnabled(False)
+        self.tray_menu.addAction(self.joplin_status)
+        self.connection_state_changed.connect(self.set_connection_state)
+        self.set_connection_state(ConnectionState.DISCONNECTED)
 
         # new note
         self.new_note = QAction("New Note")
         self.new_note.triggered.connect(note_manager.new_note)
         self.tray_menu.addAction(self.new_note)
 
+        # find note
+        self.find_note = QAction("Find Note…")
+        self.find_note.triggered.connect(note_manager.find_note)
+        self.tray_menu.addAction(self.find_note)
+
+        # open many notes
+        self.open_notes = QAction("Open Notes…")
+        self.open_notes.triggered.connect(note_manager.choose_notes)
+        self.tray_menu.addAction(self.open_notes)
+
         # notes
         self.notes_menu = QMenu("All Notes")
         self.show_all = QAction("Show")
@@ -397,6 +930,12 @@ class Tray(QSystemTrayIcon):
         self.notes_menu.addAction(self.close_all)
         self.tray_menu.addMenu(self.notes_menu)
 
+        # diagnostics
+        self.diagnostics = QAction("Diagnostics")
+        self.diagnostics.triggered.connect(self.show_diagnostics)
+        self.tray_menu.addAction(self.diagnostics)
+        self.diagnostics_window: Optional[DiagnosticsWindow] = None
+
         # quit
         self.quit_ = QAction("Quit")
         self.quit_.triggered.connect(self.parent.quit)
@@ -409,9 +948,33 @@ class Tray(QSystemTrayIcon):
         # https://stackoverflow.com/a/64438106/7410886
         self.activated.connect(lambda: self.contextMenu().popup(QCursor.pos()))
 
+    def set_api(self, api):
+        self.set_connection_state(api.breaker.state)
+        api.breaker.listeners.append(self.connection_state_changed.emit)
+
+    def set_connection_state(self, state):
+        self.joplin_status.setText(f"Joplin Status: {state.value}")
+
+    def set_token_state(self, state):
+        self.joplin_status.setText(f"Joplin Status: {state.value}")
+        # Click to try again.
+        self.joplin_status.setEnabled(state == TokenState.FAILED)
+
+    def show_diagnostics(self):
+        if self.diagnostics_window is None:
+            self.diagnostics_window = DiagnosticsWindow(self.nm)
+            self.diagnostics_window.destroyed.connect(self.on_diagnostics_closed)
+        self.diagnostics_window.show()
+        self.diagnostics_window.activateWindow()
+        self.diagnostics_window.raise_()
+
+    def on_diagnostics_closed(self):
+        self.diagnostics_window = None
+
     def show_all_notes(self):
         # https://stackoverflow.com/a/26316185/7410886
 
+        self.nm.show_hidden_notes()
         for note in self.nm.notes:
             note.show()
             note.activateWindow()
@@ -425,65 +988,113 @@ class Tray(QSystemTrayIcon):
         for note in self.nm.notes:
             note.close()
         self.nm.notes.clear()
-
-
-def main():
-    global joplin_api
-    global note_hierarchy
+        self.nm.hidden_notes.clear()
+        self.nm.collect_resource_garbage()
+        self.nm.schedule_save()
+
+
+def on_startup_error(error):
+    if not is_connection_error(error):
+        traceback.print_exception(error)
+        return
+    QMessageBox.warning(
+        None,
+        "Connect to Joplin",
+        "Couldn't connect to Joplin. Check if it's running and "
+        "the webclipper is activated.\n"
+        "Starting anyway.",
+    )
+
+
+def main(profile_startup=False, started=None):
+    """Run the app. The command line is parsed by "cli.py"."""
+    profile = StartupProfile(started)
+    if started is not None:
+        profile.mark("imports")
 
     # TODO: how to test light mode?
     # app = QApplication(['-platform', 'windows:lightmode=2'])
     app = QApplication([])
     app.setQuitOnLastWindowClosed(False)
+    profile.mark("qt")
+
+    enable_from_environment()
 
     nm = NoteManager()
+    # Keeps the command line sync from writing the state of the app.
+    nm.core.lock_app()
+    profile.mark("notes")
 
-    is_test = bool(os.getenv("TEST"))
-    if is_test:
-        stop_test_timer = QTimer()
-        stop_test_timer.singleShot(10000, app.quit)
-    else:
-        # Try to get the token either from savefile or through Joplin.
-        if (api_token := nm.settings.value("api_token", None)) is None:
-            QMessageBox.information(
-                None,
-                "Connect to Joplin",
-                "Please open Joplin, activate the webclipper. "
-                "Then click ok and accept the request.",
-            )
-            api_token = request_api_token()
-        if api_token is None:
-            QMessageBox.critical(
-                None,
-                "Connect to Joplin",
-                "Couldn't obtain API token. "
-                "Please start Joplin and activate the webclipper.",
-            )
-            sys.exit(1)
+    # The tray and the stored notes are shown before connecting to Joplin.
+    tray = Tray(app, nm)
+    profile.mark("tray")
+
+    def connect(api_token):
         nm.settings.setValue("api_token", api_token)
-        joplin_api = Api(token=api_token)
-
-        # Check if the connection is working.
-        try:
-            joplin_api.ping()
-            note_hierarchy = create_hierarchy(joplin_api)
-        except requests.ConnectionError:
-            note_hierarchy = []
-            QMessageBox.warning(
-                None,
-                "Connect to Joplin",
-                "Couldn't connect to Joplin. Check if it's running and "
-                "the webclipper is activated.\n"
-                "Starting anyway.",
-            )
+        api = nm.core.connect(
+            api_token, float(nm.settings.value("api_timeout", DEFAULT_TIMEOUT[1]))
+        )
+        tray.set_api(api)
 
-    # tray menu
-    Tray(app, nm)
+    def on_token_failed(message):
+        tray.showMessage("Connect to Joplin", message, QSystemTrayIcon.Warning)
 
-    # timer
     save_timer = QTimer()
     save_timer.timeout.connect(nm.save_update_notes)
-    save_timer.start(5000)
+
+    def connect_to_joplin():
+        # The event loop is running, so the tray and the notes are visible.
+        profile.mark("event loop")
+
+        is_test = bool(os.getenv("TEST"))
+        if is_test:
+            QTimer.singleShot(10000, app.quit)
+        elif (api_token := nm.settings.value("api_token", None)) is not None:
+            connect(api_token)
+        else:
+            # Get the token through Joplin. The user accepts the request meanwhile.
+            token_request = TokenRequest(nm.worker, parent=app)
+            token_request.state_changed.connect(tray.set_token_state)
+            token_request.accepted.connect(connect)
+            token_request.accepted.connect(lambda _: nm.refresh_hierarchy())
+            token_request.failed.connect(on_token_failed)
+            tray.joplin_status.triggered.connect(token_request.start)
+            tray.showMessage(
+                "Connect to Joplin",
+                "Please open Joplin, activate the webclipper and accept the request.",
+            )
+            token_request.start()
+
+        # The cached hierarchy is available even if Joplin isn't reachable.
+        nm.load_hierarchy(on_error=on_startup_error)
+
+        # Optional push updates. Polling is only a safety net then.
+        update_interval = POLL_INTERVAL
+        if (push_port := nm.settings.value("push_port", None)) is not None:
+            # http.server is only needed here.
+            # pylint: disable=import-outside-toplevel
+            from .push_listener import PushListener
+
+            push_listener = PushListener(
+                int(push_port), token=nm.settings.value("push_token", None), parent=app
+            )
+            if push_listener.start():
+                push_listener.notes_changed.connect(nm.on_notes_pushed)
+                app.aboutToQuit.connect(push_listener.stop)
+                update_interval = PUSH_POLL_INTERVAL
+        save_timer.start(update_interval)
+        profile.mark("connect")
+
+        if profile_startup:
+            print(profile.report(), file=sys.stderr)
+
+    QTimer.singleShot(0, connect_to_joplin)
+
+    # Don't wait for queued requests when quitting.
+    app.aboutToQuit.connect(nm.worker.cancel_all)
+    app.aboutToQuit.connect(nm.save_notes)
+    if (trace_path := trace_path_from_environment()) is not None:
+        app.aboutToQuit.connect(lambda: RECORDER.dump_chrome_trace(trace_path))
 
     sys.exit(app.exec())
 
@@ -0,0 +1,104 @@
+"""
+Command line of the app. Without a command, the app is started. "sync" warms the
+caches without user interface, for example by a login hook before the app starts:
+
+    python -m joplin_sticky_notes sync
+    python -m joplin_sticky_notes sync --interval 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import traceback
+
+from .connection import DEFAULT_TIMEOUT
+from .core import Core
+
+
+def sync(args) -> int:
+    """Returns the exit code."""
+    # Only QtCore, which works without display server.
+    from PySide6.QtCore import QSettings  # pylint: disable=import-outside-toplevel
+    import requests  # pylint: disable=import-outside-toplevel
+
+    settings = QSettings("joplin-sticky-notes", "joplin-sticky-notes")
+    if (api_token := settings.value("api_token", None)) is None:
+        print("No API token. Start the app once to connect to Joplin.", file=sys.stderr)
+        return 1
+
+    core = Core.from_settings(settings)
+    core.connect(
+        str(api_token),
+        float(str(settings.value("api_timeout", DEFAULT_TIMEOUT[1]))),
+    )
+
+    def on_note(_, note):
+        if args.verbose:
+            print(f"Fetched {note[0]}")
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if core.is_app_running():
+                    # The caches and the resource index belong to the app then. It
+                    # keeps them warm itself.
+                    print("The app is running. Skipping the sync.")
+                else:
+                    count = core.sync(on_note)
+                    print(
+                        f"Synced {len(core.hierarchy_cache.notes)} notes in the "
+                        f"hierarchy and {count} stored notes "
+                        f"in {time.perf_counter() - start:.1f} s."
+                    )
+            except requests.exceptions.ConnectionError as error:
+                print(f"Couldn't connect to Joplin: {error}", file=sys.stderr)
+                if args.interval is None:
+                    return 1
+            except Exception:  # pylint: disable=broad-exception-caught
+                traceback.print_exc()
+                if args.interval is None:
+                    return 1
+            if args.interval is None:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        core.close()
+
+
+def main(argv=None, started=None):
+    parser = argparse.ArgumentParser(
+        prog="joplin-sticky-notes",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print the time spent in each phase of the start",
+    )
+    commands = parser.add_subparsers(dest="command")
+    sync_parser = commands.add_parser(
+        "sync", help="fetch the hierarchy and the stored notes, then quit"
+    )
+    sync_parser.add_argument(
+        "--interval",
+        type=float,
+        help="keep running and sync every given number of seconds",
+    )
+    sync_parser.add_argument(
+        "--verbose", action="store_true", help="print the title of each note"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "sync":
+        sys.exit(sync(args))
+
+    # The user interface isn't needed by the other commands.
+    from .app import main as app_main  # pylint: disable=import-outside-toplevel
+
+    app_main(profile_startup=args.profile_startup, started=started)
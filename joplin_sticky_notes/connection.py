@@ -0,0 +1,22 @@
+"""
+Connection settings and states that the user interface needs before connecting.
+This module doesn't import the HTTP stack, so that the tray shows up quickly.
+"""
+
+from __future__ import annotations
+
+import enum
+from typing import Tuple
+
+
+DEFAULT_URL = "http://localhost:41184"
+# Connect and read timeout in seconds. Joplin runs locally, so connecting is fast.
+DEFAULT_TIMEOUT: Tuple[float, float] = (3.05, 10.0)
+
+
+class ConnectionState(enum.Enum):
+    CONNECTED = "Connected"
+    # Joplin was unreachable. Requests are rejected until the backoff expired.
+    DISCONNECTED = "Not Connected"
+    # The backoff expired. The next request checks if Joplin is reachable again.
+    CONNECTING = "Connecting"
@@ -0,0 +1,208 @@
+"""
+Hierarchy, sync, caches and rendering without user interface. The user interface
+runs the blocking methods in the background. "python -m joplin_sticky_notes sync"
+runs them directly.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import joppy.data_types as dt
+from PySide6.QtCore import QLockFile
+
+from .api_helper import NoteBody, TreeItem
+from .connection import DEFAULT_TIMEOUT
+from .hierarchy_cache import HierarchyCache, refresh_cache, TitleIndex
+from .render import Renderer
+from .resource_cache import DEFAULT_MAX_BYTES, ResourceCache
+from .search_index import SearchIndex
+from .storage import NoteStore, StoredNote
+from .sync import fetch_note, fetch_notes, get_updated_notes
+
+if TYPE_CHECKING:
+    from .client import Client
+
+
+# Only check if Joplin is reachable. This shouldn't take long.
+PING_TIMEOUT = (3.05, 3.0)
+
+# Held by the app while it runs. The command line sync doesn't write the state of
+# the app then.
+APP_LOCK_FILENAME = "app.lock"
+
+Hierarchy = Tuple[HierarchyCache, List[TreeItem], TitleIndex]
+Note = Tuple[str, NoteBody]
+
+
+class Core:
+    """
+    The persistent state in a folder and the connection to Joplin. Methods that
+    need Joplin block and are thread safe, except for the note store. It's only
+    used by the thread that created the core.
+    """
+
+    def __init__(self, path: Path, resource_cache_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.api: Optional[Client] = None
+        self.renderer = Renderer(path / "rendered")
+        self.resource_cache = ResourceCache(
+            path / "resources", max_bytes=resource_cache_bytes
+        )
+        self.hierarchy_cache = HierarchyCache(path / "hierarchy.json")
+        self.search_index = SearchIndex(path / "search.sqlite")
+        self.store = NoteStore(path / "notes.sqlite")
+        self.app_lock = QLockFile(str(path / APP_LOCK_FILENAME))
+
+    @classmethod
+    def from_settings(cls, settings) -> Core:
+        """The folder and the options of the QSettings of the app."""
+        return cls(
+            Path(settings.fileName()).parent,
+            resource_cache_bytes=int(
+                settings.value("resource_cache_bytes", DEFAULT_MAX_BYTES)
+            ),
+        )
+
+    def close(self):
+        self.store.close()
+        self.search_index.close()
+        if self.app_lock.isLocked():
+            self.app_lock.unlock()
+
+    def lock_app(self) -> bool:
+        """
+        Mark the folder as used by the running app. It's released when the core is
+        closed or the process exits. Returns False if another app holds it.
+        """
+        return self.app_lock.tryLock(0)
+
+    def is_app_running(self) -> bool:
+        """Whether another process runs the app on the folder."""
+        lock = QLockFile(self.app_lock.fileName())
+        # Stale locks of crashed apps are removed.
+        if not lock.tryLock(0):
+            return True
+        lock.unlock()
+        return False
+
+    def connect(self, token: str, read_timeout: Optional[float] = None) -> Client:
+        # Importing the HTTP stack takes a while. Only do it when needed.
+        from .client import Client  # pylint: disable=import-outside-toplevel
+
+        connect_timeout, default_read_timeout = DEFAULT_TIMEOUT
+        self.api = Client(
+            token=token,
+            timeout=(connect_timeout, read_timeout or default_read_timeout),
+        )
+        return self.api
+
+    def is_online(self) -> bool:
+        """Whether requests to Joplin are sent currently."""
+        return self.api is not None and not self.api.breaker.is_open()
+
+    def read_hierarchy(self) -> Hierarchy:
+        cache = HierarchyCache.load(self.hierarchy_cache.path)
+        return cache, cache.hierarchy(), cache.title_index()
+
+    def refresh_hierarchy(self) -> Hierarchy:
+        assert self.api is not None
+        # Check if the connection is working.
+        self.api.with_timeout(PING_TIMEOUT).ping()
+        cache = self.hierarchy_cache
+        if cache.cursor is None:
+            # The saved cache wasn't read yet, for example by the command line
+            # sync. It allows to refresh only the changes.
+            cache = HierarchyCache.load(cache.path)
+        cache = refresh_cache(self.api, cache, self.search_index)
+        return cache, cache.hierarchy(), cache.title_index()
+
+    def fetch_note(self, note_id: str, progress=None) -> Note:
+        assert self.api is not None
+        return fetch_note(self.api, note_id, self.resource_cache, progress=progress)
+
+    def fetch_notes(
+        self,
+        note_ids: Iterable[str],
+        notebook_ids: Iterable[str] = (),
+        tag_ids: Iterable[str] = (),
+        progress=None,
+    ) -> Tuple[Dict[str, Note], Dict[str, Exception]]:
+        """Fetch many notes at once. See "sync.fetch_notes()"."""
+        assert self.api is not None
+        return fetch_notes(
+            self.api,
+            note_ids,
+            self.resource_cache,
+            notebook_ids=notebook_ids,
+            tag_ids=tag_ids,
+            progress=progress,
+        )
+
+    def tags(self) -> List[dt.TagData]:
+        assert self.api is not None
+        tags = self.api.get_all_tags(fields="id,title", limit=100)
+        return sorted(tags, key=lambda tag: tag.title or "")
+
+    def tag_notes(self, tag_id: str) -> List[dt.NoteData]:
+        """Titles of the notes with the tag."""
+        assert self.api is not None
+        notes = self.api.get_all_notes(tag_id=tag_id, fields="id,title", limit=100)
+        return sorted(notes, key=lambda note: note.title or "")
+
+    def updated_notes(
+        self, cursor: Optional[str], note_ids: Set[str]
+    ) -> Tuple[str, Dict[str, Note]]:
+        assert self.api is not None
+        return get_updated_notes(self.api, cursor, note_ids, self.resource_cache)
+
+    def render_stored_note(self, stored_note: StoredNote, note: Note):
+        """Render a note ahead, so that it's restored from the render cache."""
+        note_title, body = note
+        stored_note.title = note_title
+        stored_note.render_key = self.renderer.key(body)
+        self.renderer.render(body, stored_note.render_key)
+        self.renderer.store(stored_note.render_key)
+
+    def sync(self, on_note: Optional[Callable[[str, Note], None]] = None) -> int:
+        """
+        Refresh the hierarchy and fetch and render all stored notes, including
+        the hidden ones. The caches are warm afterwards. Returns the number of
+        fetched notes. "on_note" is called with each fetched note. The app may
+        be started in the meantime. Only the titles and render keys of its notes
+        are changed then, and no garbage is collected.
+        """
+        import requests  # pylint: disable=import-outside-toplevel
+
+        self.hierarchy_cache = self.refresh_hierarchy()[0]
+        self.store.complete("hierarchy")
+
+        stored_notes = self.store.load()
+        note_ids = {note.joplin_id for note in stored_notes if note.joplin_id}
+        notes: Dict[str, Note] = {}
+        for note_id in note_ids:
+            try:
+                notes[note_id] = self.fetch_note(note_id)
+            except requests.exceptions.HTTPError:
+                pass  # The note was deleted in Joplin.
+            else:
+                if on_note is not None:
+                    on_note(note_id, notes[note_id])
+            self.store.complete("note", note_id)
+
+        changed_notes = []
+        for stored_note in stored_notes:
+            if stored_note.joplin_id is None:
+                continue
+            if (note := notes.get(stored_note.joplin_id)) is not None:
+                self.render_stored_note(stored_note, note)
+                changed_notes.append(stored_note)
+        self.store.save_rendered(changed_notes)
+        # The notes may be outdated. The app collects the garbage itself.
+        if not self.is_app_running():
+            self.renderer.collect_garbage(note.render_key for note in stored_notes)
+            self.resource_cache.set_open_notes(note_ids)
+            self.resource_cache.collect_garbage()
+        return len(notes)
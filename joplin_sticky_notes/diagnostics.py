@@ -0,0 +1,179 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+"""
+Window with the recorded latencies, counters and the memory usage of the notes.
+See "instrumentation.py".
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QFileDialog,
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+from PySide6.QtCore import QSize, Qt, QTimer
+
+from .instrumentation import Recorder, RECORDER
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+REFRESH_INTERVAL = 1000
+SPAN_COLUMNS = ("Span", "Count", "p50 (ms)", "p95 (ms)", "Max (ms)")
+WINDOW_COLUMNS = ("Note", "Text (kB)", "Resources (kB)")
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of the process in bytes, if available."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def window_sizes(note_manager) -> List[Tuple[str, int, int]]:
+    """
+    Approximate memory per note window: the size of the displayed text and of the
+    cached resources, which are loaded as images. The document isn't converted
+    to HTML, since this is refreshed every second.
+    """
+    return [
+        (
+            window.title_bar.label.text(),
+            # UTF-16, like QString.
+            window.note_body.document().characterCount() * 2,
+            (
+                0
+                if window.joplin_id is None
+                else note_manager.core.resource_cache.note_size(window.joplin_id)
+            ),
+        )
+        for window in note_manager.notes
+    ]
+
+
+def fill_table(table: QTableWidget, rows: List[tuple]):
+    table.setRowCount(len(rows))
+    for row, values in enumerate(rows):
+        for column, value in enumerate(values):
+            text = f"{value:.1f}" if isinstance(value, float) else str(value)
+            item = QTableWidgetItem(text)
+            if column > 0:
+                item.setTextAlignment(
+                    Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+                )
+            table.setItem(row, column, item)
+
+
+def create_table(columns) -> QTableWidget:
+    table = QTableWidget(0, len(columns))
+    table.setHorizontalHeaderLabels(columns)
+    table.verticalHeader().setVisible(False)
+    table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+    table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+    return table
+
+
+class DiagnosticsWindow(QWidget):
+    def __init__(self, note_manager, recorder: Recorder = RECORDER, parent=None):
+        super().__init__(parent)
+        self.nm = note_manager
+        self.recorder = recorder
+
+        self.setWindowTitle("Diagnostics")
+        self.setMinimumSize(QSize(500, 500))
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+
+        self.enabled_check = QCheckBox("Record")
+        self.enabled_check.setChecked(recorder.enabled)
+        self.enabled_check.toggled.connect(self.on_enabled_toggled)
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.on_reset_clicked)
+        self.save_button = QPushButton("Save Chrome Trace…")
+        self.save_button.clicked.connect(self.on_save_clicked)
+
+        self.summary_label = QLabel()
+        self.summary_label.setTextInteractionFlags(
+            Qt.TextInteractionFlag.TextSelectableByMouse
+        )
+        self.span_table = create_table(SPAN_COLUMNS)
+        self.counter_table = create_table(("Counter", "Value"))
+        self.window_table = create_table(WINDOW_COLUMNS)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.enabled_check)
+        buttons.addStretch()
+        buttons.addWidget(self.reset_button)
+        buttons.addWidget(self.save_button)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.span_table, 3)
+        layout.addWidget(self.counter_table, 2)
+        layout.addWidget(self.window_table, 2)
+
+        # Only refreshed while the window is open.
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(REFRESH_INTERVAL)
+        self.refresh()
+
+    def refresh(self):
+        recorder = self.recorder
+        fill_table(
+            self.span_table,
+            [
+                (name, stats["count"], stats["p50"], stats["p95"], stats["max"])
+                for name, stats in recorder.summary().items()
+            ],
+        )
+        _, counters = recorder.snapshot()
+        fill_table(self.counter_table, sorted(counters.items()))
+        fill_table(
+            self.window_table,
+            [
+                (title, text_size / 1024, resource_size / 1024)
+                for title, text_size, resource_size in window_sizes(self.nm)
+            ],
+        )
+
+        lines = [
+            "Requests per sync: "
+            f"{recorder.mean_count('sync.update', 'api.requests'):.1f}",
+            "Hit rate: "
+            f"render cache {recorder.hit_rate('render_cache'):.0%}, "
+            f"resource cache {recorder.hit_rate('resource_cache'):.0%}",
+        ]
+        if (rss := peak_rss()) is not None:
+            lines.append(f"Peak memory: {rss / 1024 ** 2:.0f} MB")
+        self.summary_label.setText("\n".join(lines))
+
+    def on_enabled_toggled(self, checked):
+        self.recorder.enabled = checked
+
+    def on_reset_clicked(self):
+        self.recorder.reset()
+        self.refresh()
+
+    def on_save_clicked(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Save Chrome Trace", "trace.json", "JSON (*.json)"
+        )
+        if filename:
+            self.recorder.dump_chrome_trace(Path(filename))
@@ -0,0 +1,206 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+"""
+Update a QTextDocument to new HTML by replacing only the changed blocks.
+setHtml() throws away the whole document and lays it out again, which is slow
+for long notes and resets the scroll position. Instead, the new HTML is parsed
+into a scratch document and the blocks are compared. The changed range is
+replaced through a QTextCursor.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from PySide6.QtWidgets import QTextEdit
+from PySide6.QtGui import (
+    QTextBlock,
+    QTextCursor,
+    QTextDocument,
+    QTextDocumentFragment,
+    QTextFormat,
+    QTextList,
+)
+
+from .instrumentation import count, span
+
+
+Signature = tuple
+
+
+def blocks(document: QTextDocument) -> List[QTextBlock]:
+    result = []
+    block = document.firstBlock()
+    while block.isValid():
+        result.append(block)
+        block = block.next()
+    return result
+
+
+def signature(block: QTextBlock) -> Signature:
+    """Everything that is shown of a block, comparable across documents."""
+    block_format = block.blockFormat()
+    # The indices of the objects, like lists, differ between documents.
+    block_format.clearProperty(QTextFormat.Property.ObjectIndex)
+    text_list = block.textList()
+    fragments = []
+    iterator = block.begin()
+    while not iterator.atEnd():
+        fragment = iterator.fragment()
+        char_format = fragment.charFormat()
+        char_format.clearProperty(QTextFormat.Property.ObjectIndex)
+        fragments.append((fragment.text(), char_format))
+        iterator += 1
+    return (
+        block_format,
+        block.charFormat(),
+        None if text_list is None else (text_list.format(), text_list.itemText(block)),
+        tuple(fragments),
+    )
+
+
+def has_frames(document: QTextDocument) -> bool:
+    """Whether the document contains tables. Images are empty frames."""
+    return any(
+        frame.firstPosition() <= frame.lastPosition()
+        for frame in document.rootFrame().childFrames()
+    )
+
+
+def scratch_document(document: QTextDocument, html: str) -> QTextDocument:
+    """Parse the HTML like the document would."""
+    scratch = QTextDocument()
+    scratch.setDefaultFont(document.defaultFont())
+    scratch.setDefaultStyleSheet(document.defaultStyleSheet())
+    scratch.setDocumentMargin(document.documentMargin())
+    scratch.setHtml(html)
+    return scratch
+
+
+def changed_range(old: List[Signature], new: List[Signature]) -> Tuple[int, int, int]:
+    """Length of the common prefix and the ends of the differing ranges."""
+    shortest = min(len(old), len(new))
+    prefix = 0
+    while prefix < shortest and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, len(old) - suffix, len(new) - suffix
+
+
+def select(document: QTextDocument, blocks_: List[QTextBlock], start: int, end: int):
+    """
+    Select the blocks from start to end, excluding end, together with the
+    separator in front, or behind for the first block. Fragments that start or
+    end with a separator keep the formats of all their blocks.
+    """
+    cursor = QTextCursor(document)
+    if start > 0:
+        before = blocks_[start - 1]
+        cursor.setPosition(before.position() + before.length() - 1)
+        last = blocks_[end - 1]
+        cursor.setPosition(
+            last.position() + last.length() - 1, QTextCursor.MoveMode.KeepAnchor
+        )
+    else:
+        cursor.setPosition(blocks_[end].position(), QTextCursor.MoveMode.KeepAnchor)
+    return cursor
+
+
+def patch_document(document: QTextDocument, html: str) -> Optional[bool]:
+    """
+    Change the document to show the HTML. Returns False if nothing changed,
+    True if the changed blocks were replaced and None if this isn't possible. The
+    document has to be set by setHtml() then, for example for tables or if all
+    blocks changed.
+    """
+    scratch = scratch_document(document, html)
+    if has_frames(document) or has_frames(scratch):
+        return None
+    old_blocks, new_blocks = blocks(document), blocks(scratch)
+    old = [signature(block) for block in old_blocks]
+    new = [signature(block) for block in new_blocks]
+    if old == new:
+        count("document_patch.unchanged")
+        return False
+    prefix, old_end, new_end = changed_range(old, new)
+    if prefix == 0 and old_end == len(old):
+        return None
+
+    # Inserted list items would be in new lists. They are moved to the lists of
+    # the unchanged blocks, like in the new document. The lists are kept by index,
+    # since removing their blocks deletes them.
+    lists = {}
+    for index in list(range(prefix)) + list(range(new_end, len(new_blocks))):
+        old_index = index if index < prefix else index - new_end + old_end
+        new_list = new_blocks[index].textList()
+        old_list = old_blocks[old_index].textList()
+        if new_list is not None and old_list is not None:
+            lists[new_list.objectIndex()] = old_list.objectIndex()
+    # Inserting a fragment changes the format of the unchanged block next to it.
+    neighbour, neighbour_index = (
+        (old_blocks[prefix - 1], prefix - 1)
+        if prefix
+        else (old_blocks[old_end], new_end)
+    )
+    neighbour_formats = neighbour.blockFormat(), neighbour.charFormat()
+
+    # The removed text would be kept for undo.
+    undo_redo_enabled = document.isUndoRedoEnabled()
+    document.setUndoRedoEnabled(False)
+    cursor = select(document, old_blocks, prefix, old_end)
+    cursor.beginEditBlock()
+    try:
+        cursor.removeSelectedText()
+        if new_end > prefix:
+            cursor.insertFragment(
+                QTextDocumentFragment(select(scratch, new_blocks, prefix, new_end))
+            )
+        patched_blocks = blocks(document)
+        block_cursor = QTextCursor(patched_blocks[neighbour_index])
+        block_cursor.setBlockFormat(neighbour_formats[0])
+        block_cursor.setBlockCharFormat(neighbour_formats[1])
+        for index in range(prefix, new_end):
+            new_list = new_blocks[index].textList()
+            if (
+                new_list is None
+                or (list_index := lists.get(new_list.objectIndex())) is None
+            ):
+                continue
+            # The list is gone if all its blocks were replaced.
+            if not isinstance(document.object(list_index), QTextList):
+                continue
+            block_format = new_blocks[index].blockFormat()
+            block_format.setObjectIndex(list_index)
+            QTextCursor(patched_blocks[index]).setBlockFormat(block_format)
+    finally:
+        cursor.endEditBlock()
+        document.setUndoRedoEnabled(undo_redo_enabled)
+
+    if [signature(block) for block in blocks(document)] != new:
+        count("document_patch.mismatch")
+        return None
+    count("document_patch.patched")
+    return True
+
+
+def update_html(text_edit: QTextEdit, html: str, reload_resources: bool = False):
+    """
+    Like setHtml(), but keeps the unchanged blocks and the scroll position. The
+    document keeps the loaded images, even if their files changed or were
+    missing before. If so, "reload_resources" replaces the whole document.
+    """
+    scroll_bar = text_edit.verticalScrollBar()
+    position = scroll_bar.value()
+    patched = None
+    if not reload_resources:
+        with span("render.patch"):
+            try:
+                patched = patch_document(text_edit.document(), html)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # The document may be half patched. It's replaced below.
+                count("document_patch.error")
+    if patched is None:
+        with span("render.set_html"):
+            text_edit.setHtml(html)
+    scroll_bar.setValue(position)
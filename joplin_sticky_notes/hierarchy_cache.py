@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import joppy.data_types as dt
+
+from .api_helper import build_hierarchy, TreeItem
+from .instrumentation import traced
+from .search_index import SearchIndex
+from .sync import get_changes
+
+
+FIELDS = "id,title,parent_id,updated_time"
+# Above this number of changed notes, a full reload is faster than single requests.
+MAX_INCREMENTAL_NOTES = 100
+
+
+def to_dict(item) -> dict:
+    updated_time = item.updated_time
+    return {
+        "id": item.id,
+        "title": item.title,
+        "parent_id": item.parent_id,
+        "updated_time": (
+            None if updated_time is None else int(updated_time.timestamp() * 1000)
+        ),
+    }
+
+
+class TitleIndex:
+    """Case insensitive search of notes by title. The results are sorted by title."""
+
+    def __init__(self, notes: Iterable[dt.NoteData]):
+        self.notes = sorted(notes, key=lambda note: note.title or "")
+        self.titles = [(note.title or "").casefold() for note in self.notes]
+
+    def search(self, text: str) -> List[dt.NoteData]:
+        """Find the notes that contain all words of the text."""
+        words = text.casefold().split()
+        return [
+            note
+            for note, title in zip(self.notes, self.titles)
+            if all(word in title for word in words)
+        ]
+
+
+@dataclass
+class HierarchyCache:
+    """
+    Flat notebooks and notes (title and update time) of the Joplin library.
+    It is persisted, so that the hierarchy is available without Joplin, too.
+    """
+
+    path: Path
+    cursor: Optional[str] = None
+    notebooks: Dict[str, dt.NotebookData] = field(default_factory=dict)
+    notes: Dict[str, dt.NoteData] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> HierarchyCache:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(
+                path,
+                data["cursor"],
+                {item["id"]: dt.NotebookData(**item) for item in data["notebooks"]},
+                {item["id"]: dt.NoteData(**item) for item in data["notes"]},
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing or incompatible cache. It will be recreated.
+            return cls(path)
+
+    @traced("hierarchy_cache.save")
+    def save(self):
+        data = {
+            "cursor": self.cursor,
+            "notebooks": [to_dict(item) for item in self.notebooks.values()],
+            "notes": [to_dict(item) for item in self.notes.values()],
+        }
+        # Write to a temporary file first to not corrupt the cache.
+        temporary_path = self.path.with_suffix(".tmp")
+        temporary_path.write_text(
+            json.dumps(data, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(temporary_path, self.path)
+
+    def hierarchy(self) -> List[TreeItem]:
+        return build_hierarchy(self.notebooks.values(), self.notes.values())
+
+    def title_index(self) -> TitleIndex:
+        return TitleIndex(self.notes.values())
+
+
+def refresh_cache(
+    api, cache: HierarchyCache, search_index: Optional[SearchIndex] = None
+) -> HierarchyCache:
+    """
+    Update the cache with the changes since the last refresh and save it.
+    A new cache is returned, so the old one can be used in the meantime.
+    If a search index is given, it is updated with the same changes.
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    # Notebooks aren't part of the change feed, but there are only a few.
+    notebooks = api.get_all_notebooks(fields=FIELDS, limit=100)
+    new_cache = HierarchyCache(
+        cache.path, notebooks={notebook.id: notebook for notebook in notebooks}
+    )
+    fields = FIELDS if search_index is None else f"{FIELDS},body"
+    # The index can only be updated incrementally if it's in sync with the cache.
+    index_in_sync = search_index is None or search_index.cursor == cache.cursor
+
+    if cache.cursor is not None and index_in_sync:
+        cursor, updated_ids, deleted_ids = get_changes(api, cache.cursor)
+        if len(updated_ids) <= MAX_INCREMENTAL_NOTES:
+            new_cache.cursor = cursor
+            new_cache.notes = {
+                id_: note for id_, note in cache.notes.items() if id_ not in deleted_ids
+            }
+            updated_notes = []
+            for note_id in updated_ids:
+                try:
+                    updated_notes.append(api.get_note(note_id, fields=fields))
+                except requests.exceptions.HTTPError:
+                    # The note was deleted in the meantime.
+                    new_cache.notes.pop(note_id, None)
+                    deleted_ids.add(note_id)
+            new_cache.notes.update({note.id: note for note in updated_notes})
+            if search_index is not None:
+                search_index.update(cursor, updated_notes, deleted_ids)
+
+    if new_cache.cursor is None:
+        # Get the cursor first. Changes during the download are fetched next time.
+        new_cache.cursor, _, _ = get_changes(api, None)
+        notes = api.get_all_notes(fields=fields, limit=100)
+        new_cache.notes = {note.id: note for note in notes}
+        if search_index is not None:
+            search_index.update(new_cache.cursor, notes, reset=True)
+
+    # The bodies are only needed for the search index.
+    for note in new_cache.notes.values():
+        note.body = None
+    new_cache.save()
+    return new_cache
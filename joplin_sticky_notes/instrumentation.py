@@ -0,0 +1,233 @@
+"""
+Lightweight timing spans and counters. Recording is disabled by default and
+costs only a function call and an attribute check then.
+
+Enable it by the environment variable JOPLIN_STICKY_NOTES_TRACE=1 or in the
+diagnostics window. If the variable is a path ending with ".json", a Chrome
+trace is written there when the app quits. It can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict, deque
+import contextlib
+from dataclasses import dataclass, field
+import functools
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+ENVIRONMENT_VARIABLE = "JOPLIN_STICKY_NOTES_TRACE"
+MAX_EVENTS = 20000
+NULL_SPAN = contextlib.nullcontext()
+
+
+@dataclass
+class Event:
+    name: str
+    start: float  # seconds, relative to the creation of the recorder
+    duration: float  # seconds
+    thread_id: int
+    # Counters that were increased in the same thread during the span.
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class Span:
+    __slots__ = ("recorder", "name", "start", "counts")
+
+    def __init__(self, recorder: Recorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.counts = dict(self.recorder.thread_counts())
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        end = time.perf_counter()
+        counts = {
+            name: count - self.counts.get(name, 0)
+            for name, count in self.recorder.thread_counts().items()
+            if count != self.counts.get(name, 0)
+        }
+        self.recorder.add(
+            Event(
+                self.name,
+                self.start - self.recorder.origin,
+                end - self.start,
+                threading.get_ident(),
+                counts,
+            )
+        )
+
+
+class Recorder:
+    """Thread safe store of the latest spans and all counters."""
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.events: Deque[Event] = deque(maxlen=max_events)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.local = threading.local()
+
+    def span(self, name: str):
+        """Context manager that records the duration of its block."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        counts = self.thread_counts()
+        counts[name] = counts.get(name, 0) + value
+        with self.lock:
+            self.counters[name] += value
+
+    def thread_counts(self) -> Dict[str, int]:
+        if not hasattr(self.local, "counts"):
+            self.local.counts = {}
+        return self.local.counts
+
+    def add(self, event: Event):
+        with self.lock:
+            self.events.append(event)
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.events), dict(self.counters)
+
+    def summary(self) -> Dict[str, dict]:
+        """Number of spans and latencies in milliseconds, by name."""
+        events, _ = self.snapshot()
+        durations: Dict[str, List[float]] = defaultdict(list)
+        for event in events:
+            durations[event.name].append(event.duration * 1000)
+        summary = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": values[-1],
+            }
+        return summary
+
+    def mean_count(self, span_name: str, counter_name: str) -> float:
+        """Average increase of a counter during a span, e.g. requests per sync."""
+        events, _ = self.snapshot()
+        counts = [
+            event.counts.get(counter_name, 0)
+            for event in events
+            if event.name == span_name
+        ]
+        return sum(counts) / len(counts) if counts else 0.0
+
+    def hit_rate(self, name: str) -> float:
+        """Ratio of the counters "<name>.hit" and "<name>.miss"."""
+        _, counters = self.snapshot()
+        hits, misses = counters.get(f"{name}.hit", 0), counters.get(f"{name}.miss", 0)
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def chrome_trace(self) -> dict:
+        """
+        Complete events in the Chrome trace event format. See:
+        https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+        """
+        events, counters = self.snapshot()
+        pid = os.getpid()
+        trace_events = [
+            {
+                "name": event.name,
+                "ph": "X",
+                "ts": event.start * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": pid,
+                "tid": event.thread_id,
+                "args": event.counts,
+            }
+            for event in events
+        ]
+        return {"traceEvents": trace_events, "otherData": {"counters": counters}}
+
+    def dump_chrome_trace(self, path: Path):
+        path.write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+
+
+RECORDER = Recorder()
+span = RECORDER.span
+count = RECORDER.count
+
+
+def traced(name: str):
+    """Decorator to record the duration of each call."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with RECORDER.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class StartupProfile:
+    """Duration of the phases of the start, measured between consecutive marks."""
+
+    def __init__(
+        self,
+        start: Optional[float] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.clock = clock
+        self.start = clock() if start is None else start
+        self.last = self.start
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """End a phase. The next phase starts now."""
+        now = self.clock()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        lines = [
+            f"{phase:20} {duration * 1000:8.1f} ms" for phase, duration in self.phases
+        ]
+        lines.append(f"{'total':20} {(self.last - self.start) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+def enable_from_environment():
+    if value := os.getenv(ENVIRONMENT_VARIABLE, ""):
+        RECORDER.enabled = value != "0"
+
+
+def trace_path_from_environment():
+    value = os.getenv(ENVIRONMENT_VARIABLE, "")
+    return Path(value) if value.endswith(".json") else None
@@ -1,50 +1,303 @@
 # pylint: disable=no-name-in-module,missing-function-docstring
-from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem
-from PySide6.QtCore import Qt, QSize
+from __future__ import annotations
 
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
 
-class NoteSelection(QTreeWidget):
-    def __init__(self, hierarchy, parent):
+import joppy.data_types as dt
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QComboBox,
+    QDialogButtonBox,
+    QLineEdit,
+    QTreeView,
+    QVBoxLayout,
+    QWidget,
+)
+from PySide6.QtCore import (
+    QAbstractItemModel,
+    QAbstractListModel,
+    QItemSelectionModel,
+    QModelIndex,
+    QSize,
+    Qt,
+    QTimer,
+)
+
+from .api_helper import TreeItem
+from .hierarchy_cache import TitleIndex
+from .search_index import SearchIndex
+
+
+@dataclass
+class Choice:
+    """
+    Notes chosen at once. Their notebooks and tag allow to fetch them in
+    batches. If a tag is chosen, its notes are not known yet.
+    """
+
+    notes: List[dt.NoteData] = field(default_factory=list)
+    notebook_ids: List[str] = field(default_factory=list)
+    tag_id: Optional[str] = None
+
+    def add_note(self, note: dt.NoteData, note_ids: Set[str]):
+        if note.id is not None and note.id not in note_ids:
+            note_ids.add(note.id)
+            self.notes.append(note)
+
+    def add_notebook(self, item: TreeItem, note_ids: Set[str]):
+        """Add the notes of the notebook, including the nested notebooks."""
+        if item.data.id is not None:
+            self.notebook_ids.append(item.data.id)
+        for note in item.child_notes:
+            self.add_note(note, note_ids)
+        for child_item in item.child_items:
+            self.add_notebook(child_item, note_ids)
+
+
+class HierarchyModel(QAbstractItemModel):
+    """
+    Notebooks and notes as tree. The hierarchy is already sorted. Indices are only
+    created for visible rows, so collapsed notebooks don't cost anything.
+    """
+
+    def __init__(self, hierarchy: List[TreeItem], parent=None):
+        super().__init__(parent)
+        self.hierarchy = hierarchy
+        # id(item) -> (parent item, row). Filled on demand by "index()".
+        self.parents: Dict[int, Tuple[Optional[TreeItem], int]] = {}
+
+    def item(self, index: QModelIndex):
+        return index.internalPointer() if index.isValid() else None
+
+    def child(self, item: Optional[TreeItem], row: int):
+        """Notebooks come first, then notes. Returns None for invalid rows."""
+        if item is None:
+            return self.hierarchy[row] if 0 <= row < len(self.hierarchy) else None
+        if not isinstance(item, TreeItem) or row < 0:
+            return None  # notes don't have children
+        if row < len(item.child_items):
+            return item.child_items[row]
+        row -= len(item.child_items)
+        return item.child_notes[row] if row < len(item.child_notes) else None
+
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0:
+            return QModelIndex()
+        parent_item = self.item(parent)
+        child = self.child(parent_item, row)
+        if child is None:
+            return QModelIndex()
+        self.parents[id(child)] = (parent_item, row)
+        return self.createIndex(row, column, child)
+
+    def parent(self, index=QModelIndex()):  # type: ignore[override]
+        if not index.isValid():
+            return QModelIndex()
+        parent_item, _ = self.parents[id(index.internalPointer())]
+        if parent_item is None:
+            return QModelIndex()
+        _, row = self.parents[id(parent_item)]
+        return self.createIndex(row, 0, parent_item)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        item = self.item(parent)
+        if item is None:
+            return len(self.hierarchy)
+        if isinstance(item, TreeItem):
+            return len(item.child_items) + len(item.child_notes)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        item = self.item(index)
+        if item is None:
+            return None
+        if role == Qt.DisplayRole:
+            return item.data.title if isinstance(item, TreeItem) else item.title
+        if role == Qt.UserRole:
+            return None if isinstance(item, TreeItem) else item.id
+        return None
+
+
+class SearchModel(QAbstractListModel):
+    """
+    Flat list of the notes that match the search text. The full-text index is
+    used if available. Else only the titles are searched.
+    """
+
+    def __init__(
+        self,
+        title_index: TitleIndex,
+        search_index: Optional[SearchIndex] = None,
+        parent=None,
+    ):
         super().__init__(parent)
-        self.parent = parent
+        self.title_index = title_index
+        self.search_index = search_index
+        self.notes: List = []
+
+    def search(self, text: str):
+        self.beginResetModel()
+        if self.search_index is not None and self.search_index.cursor is not None:
+            self.notes = self.search_index.search(text)
+        else:
+            self.notes = self.title_index.search(text)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.notes)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        note = self.notes[index.row()]
+        if role == Qt.DisplayRole:
+            return note.title
+        if role == Qt.UserRole:
+            return note.id
+        return None
+
+
+class NoteSelection(QWidget):
+    def __init__(self, hierarchy, title_index, search_index, on_chosen, parent=None):
+        super().__init__(parent)
+        self.on_chosen = on_chosen
 
         self.setWindowFlags(Qt.Dialog)
 
         # Make it the only clickable window.
         self.setWindowModality(Qt.ApplicationModal)
+        self.setAttribute(Qt.WA_DeleteOnClose)
 
         self.setWindowTitle("Choose Note")
         self.setMinimumSize(QSize(300, 400))
 
-        self.hierarchy = hierarchy
+        self.hierarchy_model = HierarchyModel(hierarchy, self)
+        self.search_model = SearchModel(title_index, search_index, self)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
+        self.search_edit.returnPressed.connect(self.on_return_pressed)
+
+        # Search after typing stopped shortly.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.search)
+
+        self.view = QTreeView()
+        self.view.setHeaderHidden(True)
+        self.view.setAlternatingRowColors(True)
+        self.view.setExpandsOnDoubleClick(False)
+        # All rows have the same height. This avoids measuring each row.
+        self.view.setUniformRowHeights(True)
+        self.view.setModel(self.hierarchy_model)
+        self.view.activated.connect(self.on_item_activated)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.search_edit)
+        layout.addWidget(self.view)
 
-        self.setColumnCount(2)
-        self.setColumnHidden(1, True)
-        self.setHeaderHidden(True)
-        self.setAlternatingRowColors(True)
-        self.setExpandsOnDoubleClick(False)
-        self.fill_tree()
-        self.itemDoubleClicked.connect(self.on_item_clicked)
         self.show()
         self.activateWindow()
         self.raise_()
+        self.search_edit.setFocus()
+
+    def on_search_text_changed(self, text):
+        if text.strip():
+            self.search_timer.start()
+        else:
+            self.search_timer.stop()
+            self.view.setModel(self.hierarchy_model)
+
+    def search(self):
+        self.search_model.search(self.search_edit.text())
+        self.view.setModel(self.search_model)
+
+    def on_return_pressed(self):
+        # Choose the first result.
+        if self.search_timer.isActive():
+            self.search_timer.stop()
+            self.search()
+        if self.view.model() is self.search_model and self.search_model.notes:
+            self.on_item_activated(self.search_model.index(0))
+
+    def on_item_activated(self, index):
+        note_id = index.data(Qt.UserRole)
+        if note_id:
+            self.on_chosen(index.data(Qt.DisplayRole), note_id)
+            self.close()
+
+
+class MultiNoteSelection(NoteSelection):
+    """
+    Choose many notes to open at once: Notes and whole notebooks, selected by
+    ctrl or shift click, or all notes with a tag.
+    """
+
+    def __init__(self, hierarchy, title_index, search_index, on_chosen, parent=None):
+        super().__init__(hierarchy, title_index, search_index, on_chosen, parent)
+        self.setWindowTitle("Open Notes")
+        self.view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+
+        # The tags are only known when Joplin is reachable.
+        self.tag_box = QComboBox()
+        self.tag_box.addItem("All notes with tag…")
+        self.tag_box.setEnabled(False)
+        self.tag_box.activated.connect(self.on_tag_activated)
+        self.layout().insertWidget(1, self.tag_box)
+
+        self.buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Open
+            | QDialogButtonBox.StandardButton.Cancel
+        )
+        self.buttons.accepted.connect(self.open_selected)
+        self.buttons.rejected.connect(self.close)
+        self.layout().addWidget(self.buttons)
+
+    def set_tags(self, tags: List[dt.TagData]):
+        for tag in tags:
+            self.tag_box.addItem(tag.title, tag.id)
+        self.tag_box.setEnabled(bool(tags))
+
+    def on_tag_activated(self, row):
+        if tag_id := self.tag_box.itemData(row):
+            self.on_chosen(Choice(tag_id=tag_id))
+            self.close()
+
+    def choice(self) -> Choice:
+        """The selected notes and the notes of the selected notebooks."""
+        choice = Choice()
+        note_ids: Set[str] = set()
+        for index in self.view.selectionModel().selectedRows():
+            if self.view.model() is self.search_model:
+                choice.add_note(self.search_model.notes[index.row()], note_ids)
+            elif isinstance(item := self.hierarchy_model.item(index), TreeItem):
+                choice.add_notebook(item, note_ids)
+            else:
+                choice.add_note(item, note_ids)
+        return choice
+
+    def on_item_activated(self, index):
+        # Return in the search field activates the first result, which may not be
+        # selected.
+        self.view.selectionModel().select(
+            index,
+            QItemSelectionModel.SelectionFlag.Select
+            | QItemSelectionModel.SelectionFlag.Rows,
+        )
+        self.open_selected()
 
-    def fill_tree(self):
-        def populate_store_from_hierarchy(hierarchy, root=self):
-            for item in sorted(hierarchy, key=lambda item: item.data.title):
-                new_root = QTreeWidgetItem(root)
-                new_root.setText(0, item.data.title)
-                new_root.setText(1, None)
-                new_root.setExpanded(True)
-                populate_store_from_hierarchy(item.child_items, new_root)
-                for note in sorted(item.child_notes, key=lambda note: note.title):
-                    item = QTreeWidgetItem(new_root)
-                    item.setText(0, note.title)
-                    item.setText(1, note.id)
-
-        populate_store_from_hierarchy(self.hierarchy)
-
-    def on_item_clicked(self, item):
-        if item.text(1):
-            self.parent.set_note(item.text(0), item.text(1))
+    def open_selected(self):
+        if (choice := self.choice()).notes:
+            self.on_chosen(choice)
             self.close()
@@ -0,0 +1,107 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+"""
+Localhost endpoint for change events, for example sent by a Joplin plugin on
+"joplin.workspace.onNoteChange()". The changed notes are shown immediately,
+instead of waiting for the next poll.
+
+Request: POST /notes with a JSON body like {"ids": ["<note ID>", ...]}.
+If a token is configured, the header "Authorization: Bearer <token>" is required.
+"""
+
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
+import json
+import threading
+from typing import Optional, Set
+
+from PySide6.QtCore import QObject, Signal
+
+
+DEFAULT_PORT = 41185
+# The requests contain only note IDs. Larger requests are rejected.
+MAX_BODY_BYTES = 64 * 1024
+
+
+def parse_note_ids(body: bytes) -> Set[str]:
+    """Raises ValueError for invalid requests."""
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    ids = data.get("ids", [])
+    if not isinstance(ids, list) or not all(isinstance(id_, str) for id_ in ids):
+        raise ValueError('Expected a list of note IDs at "ids"')
+    return set(ids)
+
+
+class PushListener(QObject):
+    """
+    HTTP server on localhost in a background thread. "notes_changed" is emitted
+    with the set of changed note IDs and handled in the main thread.
+    """
+
+    notes_changed = Signal(object)
+
+    def __init__(
+        self, port: int = DEFAULT_PORT, token: Optional[str] = None, parent=None
+    ):
+        super().__init__(parent)
+        self.port = port
+        self.token = token
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> bool:
+        """Returns False if the port is used already."""
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):  # pylint: disable=invalid-name
+                if self.path != "/notes":
+                    self.send_error(404)
+                    return
+                if not listener.is_authorized(self.headers.get("Authorization")):
+                    self.send_error(401)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                if length > MAX_BODY_BYTES:
+                    self.send_error(413)
+                    return
+                try:
+                    note_ids = parse_note_ids(self.rfile.read(length))
+                except ValueError as error:
+                    self.send_error(400, str(error))
+                    return
+                self.send_response(204)
+                self.end_headers()
+                if note_ids:
+                    listener.notes_changed.emit(note_ids)
+
+            def log_message(self, *_):
+                pass
+
+        try:
+            # Only local applications can connect.
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as error:
+            print(f"Couldn't start the push listener: {error}")
+            return False
+        self.port = self.server.server_address[1]
+        threading.Thread(
+            target=self.server.serve_forever,
+            args=(0.1,),
+            name="push-listener",
+            daemon=True,
+        ).start()
+        return True
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def is_authorized(self, authorization: Optional[str]) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest(authorization or "", f"Bearer {self.token}")
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .api_helper import NoteBody
+from .instrumentation import count, span
+
+
+# Changes of the HTML output invalidate the rendered notes.
+FORMAT_VERSION = "2"
+# Images, optionally inside a link already.
+IMAGE = re.compile(r'(<a\b[^>]*>\s*)?(<img\b[^>]*\bsrc="([^"]*)"[^>]*>)')
+
+
+def link_images(html: str) -> str:
+    """Link images to their source, so that the original can be opened by click."""
+    return IMAGE.sub(
+        lambda match: (
+            match.group(0)
+            if match.group(1)
+            else f'<a href="{match.group(3)}">{match.group(2)}</a>'
+        ),
+        html,
+    )
+
+
+class Renderer:
+    """
+    Convert markdown to HTML. The results are cached by content, since the same
+    content is rendered often, for example by clones and refreshes.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_size: int = 64):
+        # Created at the first conversion. Importing markdown slows down the start.
+        self.md = None
+        self.max_size = max_size
+        self.cache: OrderedDict[str, str] = OrderedDict()
+
+        # Stored results are available after a restart.
+        self.path = path
+        if self.path is not None:
+            self.path.mkdir(exist_ok=True, parents=True)
+
+    @staticmethod
+    def key(body: NoteBody) -> str:
+        content = f"{FORMAT_VERSION}\n{body.resource_version}\n{body.markdown}"
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def render(self, body: NoteBody, key: Optional[str] = None) -> str:
+        """Get the HTML of a note body. The key can be passed if it's known already."""
+        if key is None:
+            key = self.key(body)
+        if (html := self.cache.get(key)) is not None:
+            count("render_cache.hit")
+            self.cache.move_to_end(key)
+            return html
+
+        count("render_cache.miss")
+        with span("render.markdown"):
+            html = link_images(self.markdown().reset().convert(body.markdown))
+        self.add(key, html)
+        return html
+
+    def markdown(self):
+        if self.md is None:
+            from markdown import Markdown  # pylint: disable=import-outside-toplevel
+
+            self.md = Markdown(extensions=["nl2br", "sane_lists", "tables"])
+        return self.md
+
+    def add(self, key: str, html: str):
+        self.cache[key] = html
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def file(self, key: str) -> Path:
+        assert self.path is not None
+        return self.path / f"{key}.html"
+
+    def store(self, key: str) -> bool:
+        """Store a cached result persistently. Return whether it was possible."""
+        if self.path is None or (html := self.cache.get(key)) is None:
+            return self.path is not None and self.file(key).exists()
+        if not self.file(key).exists():
+            self.file(key).write_text(html, encoding="utf-8")
+        return True
+
+    def load(self, key: str) -> Optional[str]:
+        """Get a cached or stored result."""
+        if (html := self.cache.get(key)) is not None:
+            return html
+        if self.path is None:
+            return None
+        try:
+            html = self.file(key).read_text(encoding="utf-8")
+        except OSError:
+            return None
+        self.add(key, html)
+        return html
+
+    def collect_garbage(self, keys: Iterable[Optional[str]]):
+        """Remove the stored results that aren't used anymore."""
+        if self.path is None:
+            return
+        keys = set(keys)
+        for file_ in self.path.glob("*.html"):
+            if file_.stem not in keys:
+                file_.unlink(missing_ok=True)
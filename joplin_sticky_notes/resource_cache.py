@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+from concurrent.futures import as_completed, Future, ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import joppy.data_types as dt
+
+from .instrumentation import count, traced
+
+
+INDEX_FILENAME = "index.json"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Connect and read timeout in seconds. The read timeout applies per chunk.
+DOWNLOAD_TIMEOUT = (3.05, 30.0)
+
+# Shared by all notes to limit the number of concurrent downloads.
+DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="download")
+
+
+@traced("resource.download")
+def stream_resource_file(api, resource_id: str, file_: Path):
+    """
+    Download a resource in chunks to a temporary file, without keeping it in memory.
+    The file is moved afterwards, so that it's never incomplete.
+    """
+    from .client import SESSION  # pylint: disable=import-outside-toplevel
+
+    temporary_file = file_.with_name(f"{file_.name}.part")
+    with SESSION.get(
+        f"{api.url}/resources/{resource_id}/file",
+        params={"token": api.token},
+        stream=True,
+        timeout=DOWNLOAD_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        with open(temporary_file, "wb") as outfile:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                outfile.write(chunk)
+    os.replace(temporary_file, file_)
+
+
+def get_version(resource: dt.ResourceData) -> str:
+    """The blob update time identifies the content of a resource."""
+    blob_updated_time = resource.blob_updated_time or resource.updated_time
+    if blob_updated_time is None:
+        return ""
+    return str(int(blob_updated_time.timestamp() * 1000))
+
+
+class ResourceCache:
+    """
+    Downloaded Joplin resources, limited in size.
+    Resources are only downloaded again if they changed. If the cache is too big,
+    the least recently used resources are removed. Resources of open notes are kept.
+    The cache is thread safe, since it's used by the background workers.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        # Serializes writing the index, so that the latest state is written last.
+        # The cache isn't locked meanwhile.
+        self.save_lock = threading.Lock()
+
+        # resource ID -> {"version": str, "size": int, "used": float}
+        self.resources: Dict[str, dict] = {}
+        # note ID -> resource IDs
+        self.note_resources: Dict[str, List[str]] = {}
+        self.open_note_ids: Set[str] = set()
+        # resource ID -> download in flight. Notes may share resources. Each is
+        # only downloaded once at a time, since the temporary file is the same.
+        self.downloads: Dict[str, Future] = {}
+
+        try:
+            index = json.loads((self.path / INDEX_FILENAME).read_text("utf-8"))
+            self.resources = index["resources"]
+            self.note_resources = index["note_resources"]
+        except (OSError, ValueError, KeyError):
+            pass  # No index yet.
+
+    @traced("resource_cache.save")
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps(
+                    {
+                        "resources": self.resources,
+                        "note_resources": self.note_resources,
+                    },
+                    separators=(",", ":"),
+                )
+            temporary_path = self.path / f"{INDEX_FILENAME}.tmp"
+            temporary_path.write_text(data, "utf-8")
+            os.replace(temporary_path, self.path / INDEX_FILENAME)
+
+    def file(self, resource_id: str) -> Path:
+        return self.path / resource_id
+
+    def is_cached(self, resource: dt.ResourceData) -> bool:
+        assert resource.id is not None
+        with self.lock:
+            entry = self.resources.get(resource.id)
+            return (
+                entry is not None
+                and entry["version"] == get_version(resource)
+                and self.file(resource.id).exists()
+            )
+
+    def version(self, resource_ids: Iterable[str]) -> str:
+        """Identifies the downloaded content of the resources."""
+        with self.lock:
+            versions = [
+                f"{id_}:{self.resources.get(id_, {}).get('version', '')}"
+                for id_ in resource_ids
+            ]
+        return hashlib.sha1(",".join(versions).encode()).hexdigest()
+
+    @property
+    def size(self) -> int:
+        with self.lock:
+            return sum(entry["size"] for entry in self.resources.values())
+
+    def get(self, api, resource: dt.ResourceData) -> Path:
+        """Get the path of a resource. It's only downloaded if it changed."""
+        assert resource.id is not None
+        file_ = self.file(resource.id)
+        if self.is_cached(resource):
+            count("resource_cache.hit")
+        else:
+            count("resource_cache.miss")
+            with self.lock:
+                download = self.downloads.get(resource.id)
+                if started := download is None:
+                    download = self.downloads[resource.id] = Future()
+            if started:
+                self.download(api, resource, download)
+            # Raises the error of the download.
+            download.result()
+        with self.lock:
+            self.resources[resource.id]["used"] = time.time()
+        return file_
+
+    def download(self, api, resource: dt.ResourceData, download: Future):
+        assert resource.id is not None
+        file_ = self.file(resource.id)
+        try:
+            stream_resource_file(api, resource.id, file_)
+            with self.lock:
+                self.resources[resource.id] = {
+                    "version": get_version(resource),
+                    "size": file_.stat().st_size,
+                }
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            download.set_exception(error)
+        else:
+            download.set_result(file_)
+        finally:
+            with self.lock:
+                del self.downloads[resource.id]
+
+    def get_all(
+        self,
+        api,
+        resources: List[dt.ResourceData],
+        on_downloaded: Optional[Callable[[int, int], None]] = None,
+    ):
+        """
+        Get multiple resources. The missing ones are downloaded concurrently.
+        "on_downloaded" is called with the number of finished and total downloads.
+        """
+        missing = [resource for resource in resources if not self.is_cached(resource)]
+        futures = [
+            DOWNLOAD_POOL.submit(self.get, api, resource) for resource in missing
+        ]
+        # Mark the cached resources as used.
+        missing_ids = {resource.id for resource in missing}
+        for resource in resources:
+            if resource.id not in missing_ids:
+                self.get(api, resource)
+
+        if futures and on_downloaded is not None:
+            on_downloaded(0, len(futures))
+        for downloaded, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            if on_downloaded is not None:
+                on_downloaded(downloaded, len(futures))
+
+    def set_note_resources(self, note_id: str, resource_ids: Iterable[str]):
+        with self.lock:
+            self.note_resources[note_id] = list(resource_ids)
+
+    def note_size(self, note_id: str) -> int:
+        """Size of the cached resources of a note in bytes."""
+        with self.lock:
+            return sum(
+                self.resources.get(resource_id, {}).get("size", 0)
+                for resource_id in self.note_resources.get(note_id, [])
+            )
+
+    def set_open_notes(self, note_ids: Iterable[str]):
+        with self.lock:
+            self.open_note_ids = set(note_ids)
+
+    def referenced_ids(self) -> Set[str]:
+        with self.lock:
+            return {
+                resource_id
+                for note_id in self.open_note_ids
+                for resource_id in self.note_resources.get(note_id, [])
+            }
+
+    def remove(self, resource_id: str):
+        with self.lock:
+            self.resources.pop(resource_id, None)
+            self.file(resource_id).unlink(missing_ok=True)
+
+    def evict(self, keep: Iterable[str] = ()):
+        """Remove the least recently used resources until the cache is small enough."""
+        with self.lock:
+            size = self.size
+            if size <= self.max_bytes:
+                return
+            referenced_ids = self.referenced_ids() | set(keep)
+            by_usage = sorted(
+                self.resources.items(), key=lambda item: item[1].get("used", 0)
+            )
+            for resource_id, entry in by_usage:
+                if size <= self.max_bytes:
+                    break
+                if resource_id in referenced_ids:
+                    continue
+                size -= entry["size"]
+                self.remove(resource_id)
+
+    def collect_garbage(self):
+        """Remove all resources that aren't referenced by an open note."""
+        with self.lock:
+            if self.open_note_ids - set(self.note_resources):
+                # The resources of some notes are unknown, for example after an
+                # update of this app. Keep everything until they are known.
+                return
+            self.note_resources = {
+                note_id: resource_ids
+                for note_id, resource_ids in self.note_resources.items()
+                if note_id in self.open_note_ids
+            }
+            referenced_ids = self.referenced_ids()
+            for file_ in self.path.iterdir():
+                if file_.name.startswith(INDEX_FILENAME):
+                    continue
+                if file_.name.split(".")[0] in self.downloads:
+                    continue
+                if file_.name not in referenced_ids:
+                    self.remove(file_.name)
+            for resource_id in set(self.resources) - referenced_ids:
+                self.remove(resource_id)
+        self.save()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+
+import joppy.data_types as dt
+
+from .instrumentation import traced
+
+
+# Matches in the title are more relevant than matches in the body.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def to_query(text: str) -> str:
+    """
+    Convert user input to a FTS5 query. All words have to match, the last one as
+    prefix, so that results are shown while typing. Each word is quoted to avoid
+    syntax errors by special characters.
+    See: https://www.sqlite.org/fts5.html#full_text_query_syntax
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+class SearchIndex:
+    """
+    Full-text index of the titles and bodies of all Joplin notes, based on SQLite
+    FTS5. It is updated together with the hierarchy cache and queried without
+    Joplin. Each thread gets its own connection, so that searching doesn't wait
+    for an update in the background.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            # FTS5 tables can only be searched efficiently by rowid. This table
+            # maps the Joplin IDs to rowids.
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS note_ids "
+                "(rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL)"
+            )
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS notes USING fts5"
+                "(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def close(self):
+        """Close the connection of the current thread."""
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    @property
+    def cursor(self) -> Optional[str]:
+        """The cursor of the change feed the index is up to date with."""
+        row = (
+            self.connection()
+            .execute("SELECT value FROM meta WHERE key = 'cursor'")
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    @traced("search_index.update")
+    def update(
+        self,
+        cursor: str,
+        notes: Iterable[dt.NoteData],
+        deleted_ids: Iterable[str] = (),
+        reset: bool = False,
+    ):
+        """
+        Add or replace the notes and remove the deleted ones in a single transaction.
+        With "reset", all other notes are removed, too.
+        """
+        with self.connection() as connection:
+            if reset:
+                connection.execute("DELETE FROM notes")
+                connection.execute("DELETE FROM note_ids")
+            for note_id in deleted_ids:
+                self.delete(connection, note_id)
+            for note in notes:
+                self.delete(connection, note.id)
+                rowid = connection.execute(
+                    "INSERT INTO note_ids (id) VALUES (?)", (note.id,)
+                ).lastrowid
+                connection.execute(
+                    "INSERT INTO notes (rowid, title, body) VALUES (?, ?, ?)",
+                    (rowid, note.title or "", note.body or ""),
+                )
+            connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('cursor', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (cursor,),
+            )
+
+    @staticmethod
+    def delete(connection: sqlite3.Connection, note_id):
+        row = connection.execute(
+            "SELECT rowid FROM note_ids WHERE id = ?", (note_id,)
+        ).fetchone()
+        if row is not None:
+            connection.execute("DELETE FROM notes WHERE rowid = ?", row)
+            connection.execute("DELETE FROM note_ids WHERE rowid = ?", row)
+
+    def search(self, text: str, limit: int = 100) -> List[dt.NoteData]:
+        """Find the notes that contain all words. The best matches come first."""
+        query = to_query(text)
+        if not query:
+            return []
+        rows = self.connection().execute(
+            "SELECT note_ids.id, notes.title FROM notes "
+            "JOIN note_ids ON note_ids.rowid = notes.rowid "
+            "WHERE notes MATCH ? ORDER BY bm25(notes, ?, ?) LIMIT ?",
+            (query, TITLE_WEIGHT, BODY_WEIGHT, limit),
+        )
+        return [dt.NoteData(id=id_, title=title) for id_, title in rows]
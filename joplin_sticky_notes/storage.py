@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+from dataclasses import astuple, dataclass
+from pathlib import Path
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from .instrumentation import traced
+
+
+@dataclass
+class StoredNote:
+    """The persistent state of a note window."""
+
+    uid: str
+    geometry: Tuple[int, int, int, int]  # x, y, width, height
+    body_visible: bool
+    title: str
+    joplin_id: Optional[str]
+    # Joplin notes are restored by the render key. Else by the content.
+    render_key: Optional[str]
+    content: Optional[str]
+    visible: bool = True
+
+
+@dataclass
+class PendingOperation:
+    """An operation that needs Joplin. It's retried until it succeeds."""
+
+    kind: str
+    key: str = ""
+    attempts: int = 0
+    next_attempt: float = 0.0
+
+
+# Seconds until a failed operation is retried. Doubled after each attempt.
+INITIAL_RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 600.0
+
+
+def retry_delay(attempts: int) -> float:
+    return min(INITIAL_RETRY_DELAY * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+COLUMNS = (
+    "uid",
+    "x",
+    "y",
+    "width",
+    "height",
+    "body_visible",
+    "title",
+    "joplin_id",
+    "render_key",
+    "content",
+    "visible",
+)
+
+
+class NoteStore:
+    """
+    Notes in a SQLite database. Each note is a row, so that only the changed notes
+    need to be written.
+    """
+
+    def __init__(self, path: Path):
+        self.connection = sqlite3.connect(path)
+        # WAL is faster, since only the changed pages are appended.
+        # https://www.sqlite.org/wal.html
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notes (
+                    uid TEXT PRIMARY KEY,
+                    x INTEGER NOT NULL,
+                    y INTEGER NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    body_visible INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    joplin_id TEXT,
+                    render_key TEXT,
+                    content TEXT,
+                    visible INTEGER NOT NULL DEFAULT 1
+                )
+                """
+            )
+            # Add columns of newer versions to existing databases.
+            columns = {
+                row[1] for row in self.connection.execute("PRAGMA table_info(notes)")
+            }
+            if "visible" not in columns:
+                self.connection.execute(
+                    "ALTER TABLE notes ADD COLUMN visible INTEGER NOT NULL DEFAULT 1"
+                )
+            # Write-ahead queue of the operations that need Joplin. It survives
+            # restarts, so nothing is lost while Joplin isn't running.
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pending_operations (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (kind, key)
+                )
+                """
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self) -> bool:
+        return self.connection.execute("SELECT 1 FROM notes LIMIT 1").fetchone() is None
+
+    def load(self) -> List[StoredNote]:
+        # The rowid keeps the order of creation, even after updates.
+        rows = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM notes ORDER BY rowid"
+        )
+        return [
+            StoredNote(
+                uid,
+                (x, y, width, height),
+                bool(body_visible),
+                title,
+                joplin_id,
+                render_key,
+                content,
+                bool(visible),
+            )
+            for (
+                uid,
+                x,
+                y,
+                width,
+                height,
+                body_visible,
+                title,
+                joplin_id,
+                render_key,
+                content,
+                visible,
+            ) in rows
+        ]
+
+    @traced("store.save")
+    def save(self, notes: Iterable[StoredNote]):
+        """Insert or update the notes."""
+        rows = []
+        for note in notes:
+            uid, geometry, *remaining = astuple(note)
+            rows.append((uid, *geometry, *remaining))
+        updates = ", ".join(f"{column}=excluded.{column}" for column in COLUMNS[1:])
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO notes ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT(uid) DO UPDATE SET {updates}",
+                rows,
+            )
+
+    def save_rendered(self, notes: Iterable[StoredNote]):
+        """
+        Update only the title and the render key of the notes. Another process,
+        like the app, may have changed the remaining columns or deleted the notes
+        in the meantime.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE notes SET title = ?, render_key = ? WHERE uid = ?",
+                [(note.title, note.render_key, note.uid) for note in notes],
+            )
+
+    def delete(self, uids: Iterable[str]):
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM notes WHERE uid = ?", [(uid,) for uid in uids]
+            )
+
+    def enqueue(self, kind: str, key: str = ""):
+        """Add an operation. Operations are unique by kind and key."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO pending_operations (kind, key) VALUES (?, ?) "
+                "ON CONFLICT(kind, key) DO NOTHING",
+                (kind, key),
+            )
+
+    def pending(self, now: Optional[float] = None) -> List[PendingOperation]:
+        """The operations in order of creation. With "now", only the due ones."""
+        query = "SELECT kind, key, attempts, next_attempt FROM pending_operations"
+        parameters: tuple = ()
+        if now is not None:
+            query += " WHERE next_attempt <= ?"
+            parameters = (now,)
+        rows = self.connection.execute(query + " ORDER BY rowid", parameters)
+        return [PendingOperation(*row) for row in rows]
+
+    def complete(self, kind: str, key: str = ""):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM pending_operations WHERE kind = ? AND key = ?",
+                (kind, key),
+            )
+
+    def postpone(self, kind: str, key: str = "", now: Optional[float] = None):
+        """Retry a failed operation later. The delay grows with each attempt."""
+        now = time.time() if now is None else now
+        row = self.connection.execute(
+            "SELECT attempts FROM pending_operations WHERE kind = ? AND key = ?",
+            (kind, key),
+        ).fetchone()
+        if row is None:
+            return
+        attempts = row[0] + 1
+        with self.connection:
+            self.connection.execute(
+                "UPDATE pending_operations SET attempts = ?, next_attempt = ? "
+                "WHERE kind = ? AND key = ?",
+                (attempts, now + retry_delay(attempts), kind, key),
+            )
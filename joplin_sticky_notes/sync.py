@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import joppy.data_types as dt
+
+from .api_helper import get_note_body, NoteBody
+from .instrumentation import count, traced
+from .resource_cache import ResourceCache
+
+
+def get_changes(api, cursor: Optional[str]) -> Tuple[str, Set[str], Set[str]]:
+    """
+    Get the IDs of the notes that were updated or deleted since the cursor.
+    Based on the change feed: https://joplinapp.org/help/api/references/rest_api/#events
+    Without a cursor, Joplin only returns the latest cursor and no events.
+    """
+    updated_ids: Set[str] = set()
+    deleted_ids: Set[str] = set()
+
+    if cursor is None:
+        return str(api.get_events().cursor), updated_ids, deleted_ids
+
+    while True:
+        response = api.get_events(cursor=cursor)
+        for event in response.items:
+            if event.item_type != dt.ItemType.NOTE:
+                continue
+            # Only the last event of a note is relevant.
+            if event.type == dt.EventChangeType.DELETED:
+                updated_ids.discard(event.item_id)
+                deleted_ids.add(event.item_id)
+            else:
+                deleted_ids.discard(event.item_id)
+                updated_ids.add(event.item_id)
+        cursor = str(response.cursor)
+        if not response.has_more:
+            break
+    return cursor, updated_ids, deleted_ids
+
+
+def fetch_note(
+    api, note_id: str, resource_cache: ResourceCache, progress=None
+) -> Tuple[str, NoteBody]:
+    """Get title and body of a note, including its resources."""
+    note = api.get_note(note_id, fields="title,body")
+    return note.title, get_note_body(
+        api, note_id, resource_cache, note.body, progress=progress
+    )
+
+
+# Requests per bulk fetch in flight at once. Joplin handles them sequentially, but
+# the latency of the requests overlaps.
+FETCH_WORKERS = 4
+
+
+def get_note_bodies(
+    api,
+    note_ids: Set[str],
+    notebook_ids: Iterable[str] = (),
+    tag_ids: Iterable[str] = (),
+    max_workers: int = FETCH_WORKERS,
+) -> Tuple[Dict[str, dt.NoteData], Dict[str, Exception]]:
+    """
+    Get title and body of many notes in as few requests as possible. The notes of
+    the notebooks and tags are listed in pages of 100, including their bodies.
+    The remaining notes are requested one by one, concurrently. Returns the notes
+    and the errors of the notes that failed. Deleted notes are missing in both.
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    notes: Dict[str, dt.NoteData] = {}
+    listings = [{"notebook_id": id_} for id_ in notebook_ids]
+    listings += [{"tag_id": id_} for id_ in tag_ids]
+    for listing in listings:
+        for note in api.get_all_notes(fields="id,title,body", limit=100, **listing):
+            if note.id in note_ids:
+                notes[note.id] = note
+
+    errors: Dict[str, Exception] = {}
+    missing_ids = note_ids - notes.keys()
+    count("sync.single_note_requests", len(missing_ids))
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="fetch") as pool:
+        futures = {
+            pool.submit(api.get_note, note_id, fields="title,body"): note_id
+            for note_id in missing_ids
+        }
+        for future in as_completed(futures):
+            note_id = futures[future]
+            try:
+                notes[note_id] = future.result()
+            except requests.exceptions.HTTPError:
+                pass  # The note was deleted in Joplin.
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors[note_id] = error
+    return notes, errors
+
+
+@traced("sync.fetch_notes")
+def fetch_notes(
+    api,
+    note_ids: Iterable[str],
+    resource_cache: ResourceCache,
+    notebook_ids: Iterable[str] = (),
+    tag_ids: Iterable[str] = (),
+    progress: Optional[Callable[[Tuple[str, Tuple[str, NoteBody]]], None]] = None,
+    max_workers: int = FETCH_WORKERS,
+) -> Tuple[Dict[str, Tuple[str, NoteBody]], Dict[str, Exception]]:
+    """
+    Get title and body of many notes, including their resources. The notebooks
+    and tags the notes belong to allow to get the bodies in batches. The resource
+    lists are requested concurrently. Each note is passed to "progress" as soon
+    as it's complete, so that it can be shown already. A failing note doesn't
+    stop the others. Returns the notes and the errors of the failed notes.
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    bodies, errors = get_note_bodies(
+        api, set(note_ids), notebook_ids, tag_ids, max_workers
+    )
+    notes: Dict[str, Tuple[str, NoteBody]] = {}
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="fetch") as pool:
+        futures = {
+            pool.submit(
+                get_note_body, api, note_id, resource_cache, note.body or ""
+            ): note_id
+            for note_id, note in bodies.items()
+        }
+        for future in as_completed(futures):
+            note_id = futures[future]
+            try:
+                notes[note_id] = bodies[note_id].title or "", future.result()
+            except requests.exceptions.HTTPError:
+                continue  # The note was deleted in the meantime.
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors[note_id] = error
+                continue
+            if progress is not None:
+                progress((note_id, notes[note_id]))
+    return notes, errors
+
+
+@traced("sync.update")
+def get_updated_notes(
+    api, cursor: Optional[str], note_ids: Set[str], resource_cache: ResourceCache
+) -> Tuple[str, Dict[str, Tuple[str, NoteBody]]]:
+    """
+    Get title and body of the displayed notes that changed since the cursor.
+    Each note is only fetched once, even if it is displayed multiple times.
+    Deleted notes are skipped.
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    new_cursor, updated_ids, _ = get_changes(api, cursor)
+    if cursor is None:
+        # There are no events before the first cursor. Update all notes once.
+        updated_ids = note_ids
+
+    notes = {}
+    for note_id in updated_ids & note_ids:
+        try:
+            notes[note_id] = fetch_note(api, note_id, resource_cache)
+        except requests.exceptions.HTTPError:
+            continue  # The note was deleted in Joplin.
+    return new_cursor, notes
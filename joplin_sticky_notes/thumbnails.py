@@ -0,0 +1,171 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+"""
+Downscaled images for the note windows. QTextBrowser keeps every image in full
+resolution, so a few photos need hundreds of MB. Instead, the images are loaded
+as thumbnails that fit the width of the window. They are created at the first
+use and stored, so that they are only decoded once.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional, Set
+
+from PySide6.QtWidgets import QTextBrowser
+from PySide6.QtCore import QSize, QUrl
+from PySide6.QtGui import QImage, QImageIOHandler, QImageReader, QTextDocument
+
+from .document_patch import blocks
+from .instrumentation import count, span
+
+
+IMAGE_RESOURCE = QTextDocument.ResourceType.ImageResource
+# Thumbnail widths are multiples of this, in device pixels. Resizing a window
+# within a step doesn't create new thumbnails.
+WIDTH_STEP = 128
+JPEG_QUALITY = 90
+
+
+def bucket(width: float, device_pixel_ratio: float = 1.0) -> int:
+    """Round down, so that the images fit the window without scrolling."""
+    return max(WIDTH_STEP, int(width * device_pixel_ratio) // WIDTH_STEP * WIDTH_STEP)
+
+
+class ThumbnailCache:
+    """
+    Thumbnails of the images in the source folder, by width. The name of a
+    thumbnail contains the modification time of the source, so that changed
+    images get new thumbnails.
+    """
+
+    def __init__(self, path: Path, source_path: Path):
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.source_path = source_path
+
+    def stem(self, source: Path, width: int) -> str:
+        return f"{source.name}-{source.stat().st_mtime_ns}-{width}"
+
+    def get(self, source: Path, width: int) -> Optional[QImage]:
+        """Returns None if the image is narrow enough already or no image."""
+        reader = QImageReader(str(source))
+        reader.setAutoTransform(True)
+        stored_size = reader.size()
+        if not stored_size.isValid():
+            return None
+        # Photos may be stored rotated.
+        rotated = bool(
+            reader.transformation()
+            & QImageIOHandler.Transformation.TransformationRotate90
+        )
+        display_width = stored_size.height() if rotated else stored_size.width()
+        if display_width <= width:
+            return None
+
+        stem = self.stem(source, width)
+        for suffix in (".jpg", ".png"):
+            if (file_ := self.path / f"{stem}{suffix}").exists():
+                image = QImage(str(file_))
+                if not image.isNull():
+                    count("thumbnail.hit")
+                    return image
+
+        count("thumbnail.miss")
+        with span("thumbnail.create"):
+            # Decoding in the target size is much faster for JPEG.
+            scale = width / display_width
+            reader.setScaledSize(
+                QSize(
+                    max(round(stored_size.width() * scale), 1),
+                    max(round(stored_size.height() * scale), 1),
+                )
+            )
+            image = reader.read()
+            if image.isNull():
+                return None
+            suffix = ".png" if image.hasAlphaChannel() else ".jpg"
+            file_ = self.path / f"{stem}{suffix}"
+            temporary_file = file_.with_name(f"{file_.name}.part")
+            if image.save(str(temporary_file), suffix[1:], JPEG_QUALITY):
+                os.replace(temporary_file, file_)
+        return image
+
+    def collect_garbage(self):
+        """Remove the thumbnails of removed or changed images."""
+        for file_ in self.path.iterdir():
+            name, _, rest = file_.stem.rpartition("-")[0].rpartition("-")
+            source = self.source_path / name
+            try:
+                if str(source.stat().st_mtime_ns) == rest:
+                    continue
+            except OSError:
+                pass  # The source was removed.
+            file_.unlink(missing_ok=True)
+
+
+class ImageBrowser(QTextBrowser):
+    """
+    Shows the images of the source folder as thumbnails. The thumbnails are
+    replaced when the window is resized to another width step. Links and the
+    HTML keep the original images.
+    """
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        # Width of the thumbnails in device pixels.
+        self.image_width: Optional[int] = None
+
+    def available_width(self) -> int:
+        return bucket(
+            self.viewport().width() - 2 * self.document().documentMargin(),
+            self.devicePixelRatioF(),
+        )
+
+    def source_file(self, url: QUrl) -> Optional[Path]:
+        file_ = Path(url.toLocalFile() if url.isLocalFile() else url.toString())
+        if file_.parent != self.thumbnails.source_path or not file_.is_file():
+            return None
+        return file_
+
+    def image_urls(self) -> Set[str]:
+        """
+        Images of the source folder in the document. They are looked up in the
+        document, since patched documents keep the loaded images of removed
+        blocks.
+        """
+        urls = set()
+        for block in blocks(self.document()):
+            iterator = block.begin()
+            while not iterator.atEnd():
+                char_format = iterator.fragment().charFormat()
+                if char_format.isImageFormat():
+                    name = char_format.toImageFormat().name()
+                    if self.source_file(QUrl(name)) is not None:
+                        urls.add(name)
+                iterator += 1
+        return urls
+
+    def loadResource(self, type_, url):  # pylint: disable=invalid-name
+        if type_ == IMAGE_RESOURCE and (source := self.source_file(url)):
+            if self.image_width is None:
+                self.image_width = self.available_width()
+            if (image := self.thumbnails.get(source, self.image_width)) is not None:
+                image.setDevicePixelRatio(self.devicePixelRatioF())
+                return image
+        return super().loadResource(type_, url)
+
+    def resizeEvent(self, event):  # pylint: disable=invalid-name
+        super().resizeEvent(event)
+        if (width := self.available_width()) == self.image_width:
+            return
+        self.image_width = width
+        if not (urls := self.image_urls()):
+            return
+        # Replace the thumbnails in the document and lay it out again.
+        document = self.document()
+        for url in urls:
+            image = self.loadResource(IMAGE_RESOURCE, QUrl(url))
+            document.addResource(IMAGE_RESOURCE, QUrl(url), image)
+        document.markContentsDirty(0, document.characterCount())
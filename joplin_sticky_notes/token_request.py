@@ -0,0 +1,108 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+from __future__ import annotations
+
+import enum
+from typing import Optional
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from .api_helper import check_authorization, start_authorization
+from .connection import DEFAULT_URL
+
+
+class TokenState(enum.Enum):
+    IDLE = "Not Authorized"
+    REQUESTING = "Requesting Authorization"
+    WAITING = "Waiting for Authorization"
+    ACCEPTED = "Authorized"
+    FAILED = "Authorization Failed"
+
+
+class TokenRequest(QObject):
+    """
+    Request an API token without blocking the event loop. The requests are sent
+    by the worker, and the status is polled by a timer until the user accepted
+    or rejected the request in Joplin.
+    """
+
+    state_changed = Signal(object)
+    accepted = Signal(str)
+    # Emitted with a message for the user.
+    failed = Signal(str)
+
+    def __init__(
+        self,
+        worker,
+        url: str = DEFAULT_URL,
+        poll_interval: int = 1000,
+        max_polls: int = 60,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.worker = worker
+        self.url = url
+        self.max_polls = max_polls
+        self.state = TokenState.IDLE
+        self.auth_token: Optional[str] = None
+        self.polls = 0
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setSingleShot(True)
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def set_state(self, state: TokenState):
+        self.state = state
+        self.state_changed.emit(state)
+
+    def start(self):
+        if self.state in (TokenState.REQUESTING, TokenState.WAITING):
+            return
+        self.polls = 0
+        self.set_state(TokenState.REQUESTING)
+        self.worker.submit(
+            "token",
+            start_authorization,
+            self.url,
+            on_result=self.on_started,
+            on_error=self.on_error,
+        )
+
+    def on_started(self, auth_token: str):
+        self.auth_token = auth_token
+        self.set_state(TokenState.WAITING)
+        self.poll_timer.start()
+
+    def poll(self):
+        self.polls += 1
+        self.worker.submit(
+            "token",
+            check_authorization,
+            self.auth_token,
+            self.url,
+            on_result=self.on_checked,
+            on_error=self.on_error,
+        )
+
+    def on_checked(self, result):
+        status, token = result
+        if status == "accepted" and token:
+            self.set_state(TokenState.ACCEPTED)
+            self.accepted.emit(token)
+        elif status == "rejected":
+            self.fail("The request was rejected in Joplin.")
+        elif self.polls >= self.max_polls:
+            self.fail("The request wasn't accepted in time.")
+        else:
+            self.poll_timer.start()
+
+    def on_error(self, _):
+        self.fail(
+            "Couldn't connect to Joplin. "
+            "Please start Joplin and activate the webclipper."
+        )
+
+    def fail(self, message: str):
+        self.poll_timer.stop()
+        self.set_state(TokenState.FAILED)
+        self.failed.emit(message)
@@ -0,0 +1,137 @@
+# pylint: disable=no-name-in-module,missing-function-docstring
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import traceback
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+@dataclass
+class Task:
+    """A blocking function call and the callbacks waiting for its result."""
+
+    key: Hashable
+    function: Callable
+    args: tuple
+    kwargs: dict
+    on_result: List[Callable] = field(default_factory=list)
+    on_error: List[Callable] = field(default_factory=list)
+    on_progress: List[Callable] = field(default_factory=list)
+    cancelled: bool = False
+
+
+class WorkerSignals(QObject):
+    finished = Signal(object, object)
+    failed = Signal(object, object)
+    progress = Signal(object, object)
+
+
+class Runnable(QRunnable):
+    def __init__(self, task: Task, signals: WorkerSignals):
+        super().__init__()
+        self.task = task
+        # Don't reference the worker. Else it could be deleted in a pool thread.
+        self.signals = signals
+
+    def run(self):
+        if self.task.cancelled:
+            return
+        try:
+            result = self.task.function(*self.task.args, **self.task.kwargs)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self.signals.failed.emit(self.task, error)
+        else:
+            self.signals.finished.emit(self.task, result)
+
+
+class Worker(QObject):
+    """
+    Run blocking calls, like Joplin API requests, outside of the GUI thread.
+    The callbacks are executed in the GUI thread.
+    Calls with the same key are only executed once while they are in flight.
+    """
+
+    def __init__(self, max_thread_count: int = 4):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_thread_count)
+        self.tasks: Dict[Hashable, Task] = {}
+
+        # The worker lives in the GUI thread, so the signals are queued.
+        self.signals = WorkerSignals()
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        self.signals.progress.connect(self.on_progress)
+
+    def submit(
+        self,
+        key: Hashable,
+        function: Callable,
+        *args: Any,
+        on_result: Optional[Callable] = None,
+        on_error: Optional[Callable] = None,
+        on_progress: Optional[Callable] = None,
+        **kwargs: Any,
+    ) -> Task:
+        """
+        Submit a call. If "on_progress" is given, the function gets a "progress"
+        argument to report intermediate results.
+        """
+        if (task := self.tasks.get(key)) is None:
+            task = Task(key, function, args, kwargs)
+            if on_progress is not None:
+                signals = self.signals
+                kwargs["progress"] = lambda value: signals.progress.emit(task, value)
+            self.tasks[key] = task
+            self.pool.start(Runnable(task, self.signals))
+        if on_result is not None:
+            task.on_result.append(on_result)
+        if on_error is not None:
+            task.on_error.append(on_error)
+        if on_progress is not None:
+            task.on_progress.append(on_progress)
+        return task
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self.tasks
+
+    def cancel(self, key: Hashable):
+        """
+        Cancel a call. If it didn't start yet, it is skipped.
+        Else the result is discarded.
+        """
+        if (task := self.tasks.pop(key, None)) is not None:
+            task.cancelled = True
+
+    def cancel_all(self):
+        self.pool.clear()
+        for key in list(self.tasks):
+            self.cancel(key)
+
+    def pop_task(self, task: Task) -> bool:
+        if task.cancelled or self.tasks.get(task.key) is not task:
+            return False
+        del self.tasks[task.key]
+        return True
+
+    def on_progress(self, task: Task, value: Any):
+        if task.cancelled or self.tasks.get(task.key) is not task:
+            return
+        for callback in task.on_progress:
+            callback(value)
+
+    def on_finished(self, task: Task, result: Any):
+        if not self.pop_task(task):
+            return
+        for callback in task.on_result:
+            callback(result)
+
+    def on_failed(self, task: Task, error: Exception):
+        if not self.pop_task(task):
+            return
+        if not task.on_error:
+            traceback.print_exception(error)
+        for callback in task.on_error:
+            callback(error)
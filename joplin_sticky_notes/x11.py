@@ -0,0 +1,115 @@
+"""
+Hide windows from the taskbar on X11.
+See: https://specifications.freedesktop.org/wm-spec/latest/ar01s05.html#id-1.6.8
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import functools
+import subprocess
+from typing import Optional, Set
+
+from .instrumentation import traced
+
+XA_ATOM = 4
+PROP_MODE_REPLACE = 0
+
+# Windows that are hidden from the taskbar already. The window manager removes the
+# state when a window is hidden, so it has to be set again when it's shown again.
+skip_taskbar_window_ids: Set[int] = set()
+
+
+class Xlib:
+    """Minimal ctypes binding of libX11 to set window properties in-process."""
+
+    def __init__(self):
+        library_path = ctypes.util.find_library("X11")
+        if library_path is None:
+            raise OSError("libX11 not found")
+        self.lib = ctypes.CDLL(library_path)
+        self.lib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.lib.XOpenDisplay.restype = ctypes.c_void_p
+        self.lib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        self.lib.XInternAtom.restype = ctypes.c_ulong
+        self.lib.XChangeProperty.argtypes = [
+            ctypes.c_void_p,  # display
+            ctypes.c_ulong,  # window
+            ctypes.c_ulong,  # property
+            ctypes.c_ulong,  # type
+            ctypes.c_int,  # format
+            ctypes.c_int,  # mode
+            ctypes.c_void_p,  # data
+            ctypes.c_int,  # number of elements
+        ]
+        self.lib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+        self.display = self.lib.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("Couldn't open X display")
+        self.net_wm_state = self.lib.XInternAtom(self.display, b"_NET_WM_STATE", 0)
+        self.net_wm_state_skip_taskbar = self.lib.XInternAtom(
+            self.display, b"_NET_WM_STATE_SKIP_TASKBAR", 0
+        )
+
+    def set_skip_taskbar(self, window_id: int):
+        # Format 32 properties are arrays of C longs.
+        data = (ctypes.c_ulong * 1)(self.net_wm_state_skip_taskbar)
+        self.lib.XChangeProperty(
+            self.display,
+            window_id,
+            self.net_wm_state,
+            XA_ATOM,
+            32,
+            PROP_MODE_REPLACE,
+            data,
+            1,
+        )
+        # The display is private. Wait until the property is set, before Qt maps
+        # the window on its own connection.
+        self.lib.XSync(self.display, 0)
+
+
+@functools.lru_cache(maxsize=None)
+def get_xlib() -> Optional[Xlib]:
+    try:
+        return Xlib()
+    except OSError:
+        return None
+
+
+def set_skip_taskbar_xprop(window_id: int):
+    # Workaround to get multiple windows without task bar on X11.
+    # See: https://stackoverflow.com/a/75584018/7410886
+    # fmt: off
+    subprocess.check_call([
+        "xprop",
+        "-f", "_NET_WM_STATE", "32a",
+        "-id", str(window_id),
+        "-set", "_NET_WM_STATE", "_NET_WM_STATE_SKIP_TASKBAR",
+    ])
+    # fmt: on
+
+
+@traced("x11.skip_taskbar")
+def skip_taskbar(window_id: int):
+    """
+    Hide a window from the taskbar. This is done only once per window, until
+    it's hidden. libX11 is used if available. Else xprop is called as fallback.
+    """
+    if window_id in skip_taskbar_window_ids:
+        return
+    if (xlib := get_xlib()) is not None:
+        xlib.set_skip_taskbar(window_id)
+    else:
+        try:
+            set_skip_taskbar_xprop(window_id)
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            return  # xprop isn't available. Try again next time.
+    skip_taskbar_window_ids.add(window_id)
+
+
+def forget_skip_taskbar(window_id: int):
+    """The window was hidden. Hide it from the taskbar again when it's shown."""
+    skip_taskbar_window_ids.discard(window_id)
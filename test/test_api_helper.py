@@ -0,0 +1,69 @@
+import unittest
+
+import joppy.data_types as dt
+
+from joplin_sticky_notes.api_helper import create_hierarchy
+
+
+def id_(number):
+    return f"{number:032x}"
+
+
+class FakeHierarchyApi:
+    def __init__(self, notebooks, notes):
+        self.notebooks = notebooks
+        self.notes = notes
+        self.requests = 0
+
+    def get_all_notebooks(self, **_):
+        self.requests += 1
+        return self.notebooks
+
+    def get_all_notes(self, **_):
+        self.requests += 1
+        return self.notes
+
+
+class Hierarchy(unittest.TestCase):
+    def test_create_hierarchy(self):
+        notebooks = [
+            dt.NotebookData(id=id_(1), title="root", parent_id=""),
+            dt.NotebookData(id=id_(2), title="child", parent_id=id_(1)),
+            dt.NotebookData(id=id_(3), title="empty", parent_id=""),
+        ]
+        notes = [
+            dt.NoteData(id=id_(10), title="note 1", parent_id=id_(1)),
+            dt.NoteData(id=id_(11), title="note 2", parent_id=id_(2)),
+            dt.NoteData(id=id_(12), title="note 3", parent_id=id_(2)),
+        ]
+        api = FakeHierarchyApi(notebooks, notes)
+
+        hierarchy = create_hierarchy(api)
+
+        self.assertEqual(api.requests, 2)
+        # The notebooks are sorted by title.
+        empty, root = hierarchy
+        self.assertEqual(root.data.title, "root")
+        self.assertEqual([note.title for note in root.child_notes], ["note 1"])
+        (child,) = root.child_items
+        self.assertEqual(child.data.title, "child")
+        self.assertEqual(len(child.child_notes), 2)
+        self.assertEqual(child.child_items, [])
+        self.assertEqual(empty.child_notes, [])
+
+    def test_untitled(self):
+        notebooks = [
+            dt.NotebookData(id=id_(1), title="root", parent_id=""),
+            dt.NotebookData(id=id_(2), title=None, parent_id=""),
+        ]
+        notes = [
+            dt.NoteData(id=id_(10), title="note", parent_id=id_(1)),
+            dt.NoteData(id=id_(11), title=None, parent_id=id_(1)),
+        ]
+
+        hierarchy = create_hierarchy(FakeHierarchyApi(notebooks, notes))
+
+        # Untitled items are sorted first.
+        untitled, root = hierarchy
+        self.assertIsNone(untitled.data.title)
+        self.assertEqual([note.title for note in root.child_notes], [None, "note"])
@@ -1,17 +1,27 @@
+import gc
+from pathlib import Path
 import tempfile
+import time
 import unittest
 
-from PySide6.QtCore import QRect, QSettings
+import joppy.data_types as dt
+import requests
+
+from PySide6.QtCore import QEvent, QRect, QSettings, Qt
+from PySide6.QtTest import QTest
 from PySide6.QtWidgets import QApplication
 
-from joplin_sticky_notes.app import NoteManager
+from joplin_sticky_notes.api_helper import NoteBody
+from joplin_sticky_notes.app import NoteManager, NoteMenu, NoteWindow, tile
+from joplin_sticky_notes.client import CircuitBreaker, Client
+from joplin_sticky_notes.storage import NoteStore
 
 
 class QtTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         # https://github.com/jopohl/urh/blob/71153babe497a1dafa12f8dd371ed0adc305a8bb/tests/QtTestCase.py
-        cls.app = QApplication([])
+        cls.app = QApplication.instance() or QApplication([])
 
         # settings
         cls.settings_folder = tempfile.TemporaryDirectory()
@@ -22,6 +32,28 @@ class QtTestCase(unittest.TestCase):
         cls.settings = NoteManager().settings
         cls.settings.clear()
 
+    def setUp(self):
+        self.note_managers = []
+
+    def tearDown(self):
+        for nm in self.note_managers:
+            nm.save_timer.stop()
+            nm.core.close()
+        # Closed notes are only hidden. Delete all windows.
+        for widget in QApplication.topLevelWidgets():
+            if isinstance(widget, NoteWindow):
+                widget.deleteLater()
+        QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        # Collect the Qt objects in the main thread. Else the garbage collector may
+        # run in a worker thread of a later test.
+        self.note_managers.clear()
+        gc.collect()
+
+    def note_manager(self):
+        nm = NoteManager()
+        self.note_managers.append(nm)
+        return nm
+
     @classmethod
     def tearDownClass(cls):
         cls.app.quit()
@@ -48,7 +80,7 @@ class Settings(QtTestCase):
         self.settings.endArray()
 
         # settings are loaded in the note manager
-        nm = NoteManager()
+        nm = self.note_manager()
 
         self.assertEqual(len(self.app.allWindows()), 1)
         self.assertEqual(len(nm.notes), 1)
@@ -57,3 +89,263 @@ class Settings(QtTestCase):
         self.assertEqual(nm.notes[0].title_bar.label.text(), title)
         self.assertEqual(nm.notes[0].note_body.toMarkdown().strip(), content)
         self.assertEqual(nm.notes[0].joplin_id, id_)
+
+        # The notes were migrated to the database.
+        self.assertEqual(len(nm.core.store.load()), 1)
+        self.assertEqual(self.settings.beginReadArray("notes"), 0)
+        self.settings.endArray()
+
+
+class NoteTestCase(QtTestCase):
+    def setUp(self):
+        super().setUp()
+        self.settings.clear()
+        self.store = NoteStore(Path(self.settings.fileName()).parent / "notes.sqlite")
+        self.store.delete(note.uid for note in self.store.load())
+        for operation in self.store.pending():
+            self.store.complete(operation.kind, operation.key)
+
+    def tearDown(self):
+        super().tearDown()
+        self.store.close()
+
+
+class Saving(NoteTestCase):
+    def test_joplin_note_saved_compact(self):
+        id_ = "a" * 32
+        nm = self.note_manager()
+        nm.new_note(id_=id_)
+        nm.notes[0].title_bar.show_note("title", NoteBody("**text**", ""), id_)
+        nm.save_notes()
+
+        (stored_note,) = self.store.load()
+        self.assertIsNone(stored_note.content)
+        self.assertEqual(stored_note.render_key, nm.notes[0].render_key)
+        self.assertEqual(stored_note.joplin_id, id_)
+
+        # The content is restored from the render cache.
+        restored_nm = self.note_manager()
+        self.assertEqual(restored_nm.notes[0].title_bar.label.text(), "title")
+        self.assertEqual(restored_nm.notes[0].note_body.toPlainText(), "text")
+        self.assertEqual(restored_nm.notes[0].render_key, nm.notes[0].render_key)
+        self.assertEqual(restored_nm.notes[0].uid, nm.notes[0].uid)
+
+    def test_download_progress_not_saved(self):
+        id_ = "a" * 32
+        nm = self.note_manager()
+        nm.new_note(id_=id_)
+        title_bar = nm.notes[0].title_bar
+        title_bar.show_note("title", NoteBody("text", ""), id_, status="1/2")
+        self.assertEqual(title_bar.label.text(), "title")
+        self.assertEqual(title_bar.label.toolTip(), "1/2")
+        nm.save_notes()
+
+        title_bar.show_note("title", NoteBody("text", "version"), id_)
+        self.assertEqual(title_bar.label.toolTip(), "")
+        self.assertEqual(self.store.load()[0].title, "title")
+
+    def test_save_only_dirty_notes(self):
+        nm = self.note_manager()
+        nm.new_note(title="first")
+        nm.new_note(title="second")
+        nm.save_notes()
+        self.assertFalse(any(window.dirty for window in nm.notes))
+
+        first, second = self.store.load()
+        first.title = "changed externally"
+        self.store.save([first])
+
+        nm.notes[1].title_bar.label.setText("changed")
+        nm.notes[1].mark_dirty()
+        nm.save_notes()
+
+        # Only the second note was written again.
+        self.assertEqual(
+            [note.title for note in self.store.load()],
+            ["changed externally", "changed"],
+        )
+
+    def test_closed_note_deleted(self):
+        nm = self.note_manager()
+        nm.new_note(title="first")
+        nm.new_note(title="second")
+        nm.save_notes()
+
+        nm.notes[0].title_bar.on_close_clicked()
+        nm.save_notes()
+
+        self.assertEqual([note.title for note in self.store.load()], ["second"])
+
+    def test_hidden_notes_materialized_lazily(self):
+        nm = self.note_manager()
+        nm.new_note(title="hidden")
+        nm.new_note(title="visible")
+        nm.notes[0].hide()
+        nm.save_notes()
+
+        restored_nm = self.note_manager()
+        self.assertEqual(
+            [window.title_bar.label.text() for window in restored_nm.notes],
+            ["visible"],
+        )
+        self.assertEqual([note.title for note in restored_nm.hidden_notes], ["hidden"])
+
+        restored_nm.show_hidden_notes()
+        self.assertEqual(len(restored_nm.notes), 2)
+        self.assertEqual(restored_nm.hidden_notes, [])
+        restored_nm.save_notes()
+        self.assertTrue(all(note.visible for note in self.store.load()))
+
+
+class FakeNoteApi:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.requested_ids = []
+        self.failing_ids = set()
+
+    def get_note(self, id_, **_):
+        self.requested_ids.append(id_)
+        if id_ in self.failing_ids:
+            raise requests.exceptions.ConnectionError()
+        return dt.NoteData(title="joplin title", body="**text**")
+
+    def get_all_resources(self, **_):
+        return []
+
+
+class Offline(NoteTestCase):
+    def test_note_fetched_when_online(self):
+        id_ = "a" * 32
+        nm = self.note_manager()
+        nm.new_note()
+        # Joplin isn't available yet.
+        nm.notes[0].title_bar.set_note("chosen title", id_)
+        self.assertEqual(nm.notes[0].title_bar.label.text(), "chosen title")
+        nm.save_notes()
+
+        # The operation survives a restart.
+        restored_nm = self.note_manager()
+        self.assertEqual(
+            [
+                (operation.kind, operation.key)
+                for operation in restored_nm.core.store.pending()
+            ],
+            [("note", id_)],
+        )
+
+        restored_nm.core.api = FakeNoteApi()
+        restored_nm.replay_operations()
+        restored_nm.worker.pool.waitForDone()
+        self.app.processEvents()
+
+        self.assertEqual(restored_nm.core.api.requested_ids, [id_])
+        self.assertEqual(restored_nm.core.store.pending(), [])
+        window = restored_nm.notes[0]
+        self.assertEqual(window.title_bar.label.text(), "joplin title")
+        self.assertEqual(window.note_body.toPlainText(), "text")
+
+    def test_pushed_notes_fetched(self):
+        nm = self.note_manager()
+        nm.new_note(id_="a" * 32)
+        nm.core.api = FakeNoteApi()
+        nm.on_notes_pushed({"a" * 32, "b" * 32})
+        nm.worker.pool.waitForDone()
+        self.app.processEvents()
+
+        # Only displayed notes are fetched.
+        self.assertEqual(nm.core.api.requested_ids, ["a" * 32])
+        self.assertEqual(nm.notes[0].title_bar.label.text(), "joplin title")
+
+    def test_retry_with_backoff(self):
+        nm = self.note_manager()
+        nm.core.api = Client("token", url="http://127.0.0.1:9")
+        nm.core.api.breaker.on_failure()  # Joplin is unreachable.
+        nm.refresh_hierarchy()
+        nm.worker.pool.waitForDone()
+        self.app.processEvents()
+
+        (operation,) = self.store.pending()
+        self.assertEqual((operation.kind, operation.attempts), ("hierarchy", 1))
+        self.assertGreater(operation.next_attempt, time.time())
+        # Not due yet.
+        self.assertEqual(self.store.pending(time.time()), [])
+
+
+class OpenNotes(NoteTestCase):
+    def test_tile(self):
+        area = QRect(0, 0, 1920, 1080)
+        geometries = tile(30, area)
+        self.assertEqual(len(geometries), 30)
+        # All notes are visible and don't overlap.
+        for index, geometry in enumerate(geometries):
+            self.assertTrue(area.contains(geometry))
+            for other in geometries[index + 1 :]:
+                self.assertFalse(geometry.intersects(other))
+        # Few notes keep their size.
+        self.assertEqual(tile(2, area)[1], QRect(410, 0, 400, 300))
+        # Too many notes are stacked.
+        geometries = tile(500, area)
+        self.assertTrue(all(area.intersects(geometry) for geometry in geometries))
+
+    def test_open_notes(self):
+        nm = self.note_manager()
+        nm.core.api = FakeNoteApi()
+        notes = [dt.NoteData(id=f"{number:032x}", title="title") for number in range(3)]
+        nm.open_notes(notes)
+        self.assertEqual(
+            [window.joplin_id for window in nm.notes], [n.id for n in notes]
+        )
+        nm.worker.pool.waitForDone()
+        self.app.processEvents()
+
+        self.assertCountEqual(nm.core.api.requested_ids, [note.id for note in notes])
+        self.assertEqual(nm.core.store.pending(), [])
+        for window in nm.notes:
+            self.assertEqual(window.title_bar.label.text(), "joplin title")
+            self.assertEqual(window.note_body.toPlainText(), "text")
+
+    def test_failed_note_retried(self):
+        nm = self.note_manager()
+        nm.core.api = FakeNoteApi()
+        failing_id = "0" * 32
+        nm.core.api.failing_ids = {failing_id}
+        notes = [dt.NoteData(id=f"{number:032x}", title="title") for number in range(3)]
+        nm.open_notes(notes)
+        nm.worker.pool.waitForDone()
+        self.app.processEvents()
+
+        # Only the failed note is fetched again.
+        self.assertEqual(
+            [(op.kind, op.key) for op in nm.core.store.pending()],
+            [("note", failing_id)],
+        )
+        self.assertEqual(
+            [window.title_bar.label.text() for window in nm.notes],
+            ["title", "joplin title", "joplin title"],
+        )
+
+
+class Menu(NoteTestCase):
+    def test_shared_menu(self):
+        nm = self.note_manager()
+        nm.new_note(id_="a" * 32)
+        nm.new_note()
+        first, second = nm.notes
+        menu = NoteMenu.instance()
+        self.assertIs(first.title_bar.configure_button.menu(), menu)
+        self.assertIs(second.title_bar.configure_button.menu(), menu)
+
+        menu.set_target(first.title_bar)
+        self.assertEqual(menu.info_id.text(), f"ID: {'a' * 32}")
+        menu.toggle_body.trigger()
+        self.assertTrue(first.note_body.isHidden())
+        self.assertFalse(second.note_body.isHidden())
+
+        menu.set_target(second.title_bar)
+        menu.hide_note.trigger()
+        self.assertTrue(second.isHidden())
+        self.assertFalse(first.isHidden())
+
+        # Pressing the button with the keyboard retargets the menu, too.
+        QTest.keyPress(first.title_bar.configure_button, Qt.Key_Space)
+        self.assertIs(menu.target, first.title_bar)
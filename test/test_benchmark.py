@@ -0,0 +1,20 @@
+import json
+from pathlib import Path
+import tempfile
+
+from benchmark.__main__ import BENCHMARKS, main
+from test.test_basic import QtTestCase
+
+
+class Benchmark(QtTestCase):
+    def test_all_benchmarks_run(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output = Path(folder) / "results.json"
+            main(["--sizes", "20", "--repeat", "1", "--output", str(output)])
+            report = json.loads(output.read_text(encoding="utf-8"))
+
+        self.assertEqual(
+            [result["name"] for result in report["results"]], list(BENCHMARKS)
+        )
+        for result in report["results"]:
+            self.assertGreater(result["median"], 0)
@@ -0,0 +1,127 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+import time
+import unittest
+
+import requests
+
+from joplin_sticky_notes.client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Client,
+    ConnectionState,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class FakeJoplin(ThreadingHTTPServer):
+    """Answers pings. Requests to "/slow" take a second."""
+
+    def __init__(self):
+        self.connections = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.startswith("/slow"):
+                    time.sleep(1)
+                body = b"JoplinClipperServer"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True).start()
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+class Breaker(unittest.TestCase):
+    def test_exponential_backoff(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(initial_backoff=1, max_backoff=4, clock=clock)
+        states = []
+        breaker.listeners.append(states.append)
+
+        breaker.before_request()
+        breaker.on_failure()
+        self.assertTrue(breaker.is_open())
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+
+        clock.time = 1
+        breaker.before_request()  # probe
+        # Only one probe at a time.
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+        breaker.on_failure()
+        self.assertEqual(breaker.retry_in(), 2)
+
+        for _ in range(3):
+            clock.time += breaker.retry_in()
+            breaker.before_request()
+            breaker.on_failure()
+        self.assertEqual(breaker.retry_in(), 4)
+
+        clock.time += 4
+        breaker.before_request()
+        breaker.on_success()
+        self.assertFalse(breaker.is_open())
+        breaker.before_request()
+        self.assertEqual(
+            states,
+            [ConnectionState.DISCONNECTED, ConnectionState.CONNECTING]
+            + [ConnectionState.DISCONNECTED, ConnectionState.CONNECTING] * 4
+            + [ConnectionState.CONNECTED],
+        )
+
+
+class Requests(unittest.TestCase):
+    def test_unreachable(self):
+        client = Client("token", url=unused_url())
+        self.assertRaises(requests.exceptions.ConnectionError, client.ping)
+        self.assertEqual(client.breaker.state, ConnectionState.DISCONNECTED)
+        # No request is sent during the backoff.
+        self.assertRaises(CircuitOpenError, client.ping)
+
+    def test_keep_alive_and_timeout(self):
+        server = FakeJoplin()
+        try:
+            client = Client("token", url=server.url)
+            for _ in range(3):
+                self.assertEqual(client.ping().text, "JoplinClipperServer")
+            self.assertEqual(server.connections, 1)
+
+            fast_client = client.with_timeout(0.1)
+            self.assertRaises(requests.exceptions.Timeout, fast_client.get, "/slow")
+            # The circuit breaker is shared.
+            self.assertTrue(client.breaker.is_open())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import argparse
+from pathlib import Path
+import tempfile
+import unittest
+
+import requests
+
+from PySide6.QtCore import QSettings
+
+from benchmark.fake_joplin import FakeJoplin, generate_library
+from joplin_sticky_notes.cli import sync
+from joplin_sticky_notes.client import Client
+from joplin_sticky_notes.core import Core
+from joplin_sticky_notes.storage import StoredNote
+
+
+def stored_note(uid, joplin_id, visible=True):
+    return StoredNote(
+        uid, (0, 0, 100, 100), True, "old title", joplin_id, None, None, visible
+    )
+
+
+class Sync(unittest.TestCase):
+    def setUp(self):
+        self.library = generate_library(notes=5, depth=1, breadth=2)
+        self.server = FakeJoplin(self.library)
+        self.folder = tempfile.TemporaryDirectory()
+        self.core = Core(Path(self.folder.name))
+        self.core.api = Client("token", url=self.server.url)
+
+    def tearDown(self):
+        self.core.close()
+        self.server.close()
+        self.folder.cleanup()
+
+    def test_caches_warm(self):
+        first_id, second_id = list(self.library.notes)[:2]
+        self.core.store.save(
+            [
+                stored_note("a", first_id),
+                stored_note("b", second_id, visible=False),
+                stored_note("c", "f" * 32),  # deleted in Joplin
+                stored_note("d", None),
+            ]
+        )
+        self.core.store.enqueue("note", first_id)
+
+        fetched = []
+        self.assertEqual(self.core.sync(lambda id_, _: fetched.append(id_)), 2)
+        self.assertCountEqual(fetched, [first_id, second_id])
+
+        self.assertEqual(len(self.core.hierarchy_cache.notes), 5)
+        self.assertEqual(self.core.store.pending(), [])
+        # All notes are restored from the render cache by the app.
+        notes = {note.uid: note for note in self.core.store.load()}
+        for uid, joplin_id in (("a", first_id), ("b", second_id)):
+            self.assertEqual(notes[uid].title, self.library.notes[joplin_id]["title"])
+            html = self.core.renderer.load(notes[uid].render_key)
+            self.assertIn(f"Note {int(joplin_id[4:], 16)}", html)
+        self.assertEqual(notes["c"].title, "old title")
+
+        # Only the changes are fetched the next time.
+        requests = self.server.requests
+        self.core.sync()
+        self.assertLess(self.server.requests - requests, 10)
+
+    def test_app_state_kept(self):
+        first_id, second_id = list(self.library.notes)[:2]
+        self.core.store.save([stored_note("a", first_id), stored_note("b", second_id)])
+        app_core = Core(Path(self.folder.name))
+        self.assertTrue(app_core.lock_app())
+        self.assertTrue(self.core.is_app_running())
+        self.core.renderer.add("opened", "<p>opened by the app</p>")
+        self.core.renderer.store("opened")
+
+        def on_note(note_id, _):
+            # The app moves and closes a note in the meantime.
+            if note_id == first_id:
+                moved = stored_note("a", first_id)
+                moved.geometry = (50, 50, 100, 100)
+                app_core.store.save([moved])
+                app_core.store.delete(["b"])
+
+        self.core.sync(on_note)
+        (note,) = self.core.store.load()
+        self.assertEqual(note.geometry, (50, 50, 100, 100))
+        self.assertEqual(note.title, self.library.notes[first_id]["title"])
+        # No garbage is collected.
+        self.assertTrue(self.core.renderer.file("opened").exists())
+
+        app_core.close()
+        self.assertFalse(self.core.is_app_running())
+
+    def test_saved_hierarchy_refreshed_incrementally(self):
+        self.core.sync()
+        requests = self.server.requests
+        self.core.sync()
+        incremental_requests = self.server.requests - requests
+
+        # Like a new run of the command line sync.
+        core = Core(Path(self.folder.name))
+        core.api = Client("token", url=self.server.url)
+        requests = self.server.requests
+        core.sync()
+        core.close()
+        self.assertEqual(self.server.requests - requests, incremental_requests)
+
+
+class FetchNotes(unittest.TestCase):
+    def setUp(self):
+        self.library = generate_library(notes=40, depth=1, breadth=2, tags=2)
+        self.server = FakeJoplin(self.library)
+        self.folder = tempfile.TemporaryDirectory()
+        self.core = Core(Path(self.folder.name))
+        self.core.api = Client("token", url=self.server.url)
+
+    def tearDown(self):
+        self.core.close()
+        self.server.close()
+        self.folder.cleanup()
+
+    def test_notebook_batched(self):
+        notebook_id = next(iter(self.library.notebooks))
+        note_ids = [
+            note["id"]
+            for note in self.library.notes.values()
+            if note["parent_id"] == notebook_id
+        ]
+        fetched = []
+        notes, errors = self.core.fetch_notes(
+            note_ids, notebook_ids=[notebook_id], progress=fetched.append
+        )
+        self.assertEqual(errors, {})
+        self.assertCountEqual(notes, note_ids)
+        self.assertCountEqual([note_id for note_id, _ in fetched], note_ids)
+        title, body = notes[note_ids[0]]
+        self.assertEqual(title, self.library.notes[note_ids[0]]["title"])
+        self.assertIn("# Note", body.markdown)
+        # One listing of the notebook and a resource list per note.
+        self.assertEqual(self.server.requests, 1 + len(note_ids))
+
+    def test_tag(self):
+        tag = self.core.tags()[0]
+        notes = self.core.tag_notes(tag.id)
+        self.assertEqual(len(notes), 20)
+        requests = self.server.requests
+        fetched, _ = self.core.fetch_notes(
+            [note.id for note in notes], tag_ids=[tag.id]
+        )
+        self.assertEqual(len(fetched), 20)
+        self.assertEqual(self.server.requests - requests, 1 + 20)
+
+    def test_single_notes_and_deleted(self):
+        note_ids = list(self.library.notes)[:3]
+        notes, errors = self.core.fetch_notes(note_ids + ["f" * 32])
+        self.assertCountEqual(notes, note_ids)
+        self.assertEqual(errors, {})
+
+    def test_failed_note_skipped(self):
+        note_ids = list(self.library.notes)[:3]
+        get_note = self.core.api.get_note
+
+        def failing_get_note(id_, **kwargs):
+            if id_ == note_ids[0]:
+                raise requests.exceptions.ConnectionError()
+            return get_note(id_, **kwargs)
+
+        self.core.api.get_note = failing_get_note
+        notes, errors = self.core.fetch_notes(note_ids)
+        self.assertCountEqual(notes, note_ids[1:])
+        self.assertIsInstance(errors[note_ids[0]], requests.exceptions.ConnectionError)
+
+
+class Cli(unittest.TestCase):
+    def test_without_token(self):
+        with tempfile.TemporaryDirectory() as folder:
+            QSettings.setPath(
+                QSettings.defaultFormat(), QSettings.Scope.UserScope, folder
+            )
+            args = argparse.Namespace(interval=None, verbose=False)
+            self.assertEqual(sync(args), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+from pathlib import Path
+import tempfile
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage, QTextDocument
+from PySide6.QtWidgets import QTextBrowser
+
+from joplin_sticky_notes.document_patch import (
+    blocks,
+    patch_document,
+    signature,
+    update_html,
+)
+from joplin_sticky_notes.render import Renderer
+
+from .test_basic import QtTestCase
+
+
+CHECKLIST = "\n".join(f"- [ ] item {number}" for number in range(200))
+NOTE = (
+    "# Title\n\nsome **bold** text\n\n- [ ] one\n- [x] two\n- [ ] three\n\n"
+    "1. a\n2. b\n\n```\ncode\n```\n\nlast"
+)
+
+
+def html(markdown):
+    return Renderer().markdown().convert(markdown)
+
+
+class Patch(QtTestCase):
+    def assert_patched(self, old, new, expected=True):
+        document = QTextDocument()
+        document.setHtml(html(old))
+        self.assertEqual(patch_document(document, html(new)), expected)
+
+        # Like a new document.
+        fresh_document = QTextDocument()
+        fresh_document.setHtml(html(new))
+        self.assertEqual(document.toPlainText(), fresh_document.toPlainText())
+        self.assertEqual(
+            [signature(block) for block in blocks(document)],
+            [signature(block) for block in blocks(fresh_document)],
+        )
+        return document
+
+    def test_changed_blocks(self):
+        for new in (
+            NOTE.replace("some", "changed"),
+            NOTE.replace("[x] two", "[ ] two"),
+            NOTE.replace("# Title", "# Other"),
+            NOTE.replace("last", "end"),
+            NOTE + "\n\nmore",
+            NOTE.replace("- [ ] one\n", "- [ ] zero\n- [ ] one\n"),
+            NOTE.replace("- [ ] three\n", ""),
+            NOTE.replace("2. b\n", "2. b\n3. c\n"),
+            NOTE.replace("1. a\n", ""),
+            NOTE.replace("last", "- new\n- list"),
+        ):
+            with self.subTest(new=new):
+                self.assert_patched(NOTE, new)
+        # The list of the first item is deleted with it.
+        with self.subTest(new="- x\n- b"):
+            self.assert_patched("- a\n- b", "- x\n- b")
+
+    def test_unchanged(self):
+        self.assert_patched(NOTE, NOTE, expected=False)
+
+    def test_only_changed_blocks_replaced(self):
+        document = QTextDocument()
+        document.setHtml(html(CHECKLIST))
+        changes = []
+        document.contentsChange.connect(
+            lambda position, removed, added: changes.append((removed, added))
+        )
+        patch_document(
+            document, html(CHECKLIST.replace("[ ] item 100", "[x] item 100"))
+        )
+        self.assertLess(sum(removed + added for removed, added in changes), 50)
+        self.assertEqual(document.findBlockByNumber(100).text(), "[x] item 100")
+        self.assertFalse(document.isUndoAvailable())
+
+    def test_not_supported(self):
+        table = "| a | b |\n|---|---|\n| 1 | 2 |"
+        document = QTextDocument()
+        document.setHtml(html(NOTE))
+        self.assertIsNone(patch_document(document, html(NOTE + "\n\n" + table)))
+        # Nothing in common.
+        self.assertIsNone(patch_document(document, html("other")))
+
+    def test_scroll_position_kept(self):
+        browser = QTextBrowser()
+        browser.resize(300, 200)
+        browser.setHtml(html(CHECKLIST))
+        browser.show()
+        scroll_bar = browser.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum() // 2)
+        position = scroll_bar.value()
+        self.assertGreater(position, 0)
+
+        update_html(browser, html(CHECKLIST.replace("[ ] item 150", "[x] item 150")))
+        self.assertEqual(scroll_bar.value(), position)
+        self.assertIn("[x] item 150", browser.toPlainText())
+        browser.close()
+
+    def test_resources_reloaded(self):
+        with tempfile.TemporaryDirectory() as folder:
+            image_file = Path(folder) / "image"
+            image_html = html(f"text\n\n![image]({image_file})")
+            browser = QTextBrowser()
+            browser.resize(300, 400)
+            browser.setHtml(image_html)
+            browser.show()
+            # The image was downloaded after the first rendering.
+            image = QImage(100, 200, QImage.Format_RGB32)
+            image.fill(Qt.red)
+            image.save(str(image_file), "PNG")
+
+            update_html(browser, image_html)
+            self.assertLess(browser.document().size().height(), 200)
+            update_html(browser, image_html, reload_resources=True)
+            self.assertGreater(browser.document().size().height(), 200)
+            browser.close()
@@ -0,0 +1,136 @@
+import copy
+from pathlib import Path
+import tempfile
+import unittest
+
+import joppy.data_types as dt
+
+from joplin_sticky_notes.hierarchy_cache import HierarchyCache, refresh_cache
+from joplin_sticky_notes.search_index import SearchIndex
+
+
+def id_(number):
+    return f"{number:032x}"
+
+
+def event(item_id, type_):
+    return dt.EventData(item_type=dt.ItemType.NOTE.value, item_id=item_id, type=type_)
+
+
+class FakeLibraryApi:
+    def __init__(self):
+        self.notebooks = [dt.NotebookData(id=id_(1), title="notebook", parent_id="")]
+        self.notes = {
+            id_(number): dt.NoteData(
+                id=id_(number),
+                title=f"note {number}",
+                parent_id=id_(1),
+                updated_time=1700000000000,
+                body=f"body {number}",
+            )
+            for number in range(10, 13)
+        }
+        self.events = []
+        self.full_downloads = 0
+
+    def get_all_notebooks(self, **_):
+        return self.notebooks
+
+    def get_all_notes(self, **_):
+        self.full_downloads += 1
+        return [copy.copy(note) for note in self.notes.values()]
+
+    def get_note(self, id_, **_):
+        return copy.copy(self.notes[id_])
+
+    def get_events(self, cursor=None):
+        if cursor is None:
+            return dt.DataList(has_more=False, cursor=len(self.events))
+        return dt.DataList(
+            has_more=False, cursor=len(self.events), items=self.events[int(cursor) :]
+        )
+
+
+class Cache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "hierarchy.json"
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_missing_cache(self):
+        cache = HierarchyCache.load(self.path)
+        self.assertIsNone(cache.cursor)
+        self.assertEqual(cache.hierarchy(), [])
+
+    def test_refresh_and_load(self):
+        api = FakeLibraryApi()
+        cache = refresh_cache(api, HierarchyCache.load(self.path))
+        self.assertEqual(api.full_downloads, 1)
+
+        loaded_cache = HierarchyCache.load(self.path)
+        self.assertEqual(loaded_cache.cursor, "0")
+        self.assertEqual(loaded_cache.notes, cache.notes)
+        (notebook,) = loaded_cache.hierarchy()
+        self.assertEqual(notebook.data.title, "notebook")
+        self.assertEqual(len(notebook.child_notes), 3)
+
+    def test_incremental_refresh(self):
+        api = FakeLibraryApi()
+        cache = refresh_cache(api, HierarchyCache.load(self.path))
+
+        api.notes[id_(10)] = dt.NoteData(
+            id=id_(10), title="renamed", parent_id=id_(1), updated_time=1800000000000
+        )
+        del api.notes[id_(11)]
+        api.events = [event(id_(10), 2), event(id_(11), 3)]
+        cache = refresh_cache(api, cache)
+
+        self.assertEqual(api.full_downloads, 1)
+        self.assertEqual(cache.cursor, "2")
+        self.assertEqual(
+            sorted(note.title for note in cache.notes.values()), ["note 12", "renamed"]
+        )
+
+
+class SearchIndexUpdate(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "hierarchy.json"
+        self.index = SearchIndex(Path(self.folder.name) / "search.sqlite")
+
+    def tearDown(self):
+        self.index.close()
+        self.folder.cleanup()
+
+    def search_titles(self, text):
+        return [note.title for note in self.index.search(text)]
+
+    def test_index_updated_with_cache(self):
+        api = FakeLibraryApi()
+        cache = refresh_cache(api, HierarchyCache.load(self.path), self.index)
+        self.assertEqual(self.index.cursor, cache.cursor)
+        self.assertEqual(self.search_titles("body 11"), ["note 11"])
+        # The bodies aren't kept in the cache.
+        self.assertIsNone(cache.notes[id_(11)].body)
+
+        api.notes[id_(10)] = dt.NoteData(
+            id=id_(10), title="renamed", parent_id=id_(1), body="changed"
+        )
+        del api.notes[id_(11)]
+        api.events = [event(id_(10), 2), event(id_(11), 3)]
+        cache = refresh_cache(api, cache, self.index)
+
+        self.assertEqual(api.full_downloads, 1)
+        self.assertEqual(self.index.cursor, "2")
+        self.assertEqual(self.search_titles("changed"), ["renamed"])
+        self.assertEqual(self.search_titles("body"), ["note 12"])
+
+    def test_index_out_of_sync(self):
+        api = FakeLibraryApi()
+        cache = refresh_cache(api, HierarchyCache.load(self.path))
+        # The cache is up to date, but the index is new.
+        refresh_cache(api, cache, self.index)
+        self.assertEqual(api.full_downloads, 2)
+        self.assertEqual(len(self.search_titles("body")), 3)
@@ -0,0 +1,136 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from joplin_sticky_notes.diagnostics import DiagnosticsWindow
+from joplin_sticky_notes.instrumentation import percentile, Recorder, StartupProfile
+
+from .test_basic import QtTestCase
+
+
+class Instrumentation(unittest.TestCase):
+    def setUp(self):
+        self.recorder = Recorder()
+        self.recorder.enabled = True
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_disabled(self):
+        self.recorder.enabled = False
+        with self.recorder.span("span"):
+            self.recorder.count("counter")
+        self.assertEqual(self.recorder.snapshot(), ([], {}))
+
+    def test_summary(self):
+        for _ in range(3):
+            with self.recorder.span("span"):
+                pass
+        summary = self.recorder.summary()
+        self.assertEqual(list(summary), ["span"])
+        self.assertEqual(summary["span"]["count"], 3)
+        self.assertLessEqual(summary["span"]["p50"], summary["span"]["max"])
+
+    def test_counts_per_span(self):
+        with self.recorder.span("sync"):
+            self.recorder.count("requests", 2)
+        with self.recorder.span("sync"):
+            self.recorder.count("requests", 4)
+        # Counters of other threads don't belong to the span.
+        with self.recorder.span("sync"):
+            thread = threading.Thread(target=self.recorder.count, args=("requests",))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(self.recorder.mean_count("sync", "requests"), 2)
+        self.assertEqual(self.recorder.snapshot()[1], {"requests": 7})
+
+    def test_hit_rate(self):
+        self.assertEqual(self.recorder.hit_rate("cache"), 0.0)
+        self.recorder.count("cache.hit", 3)
+        self.recorder.count("cache.miss")
+        self.assertEqual(self.recorder.hit_rate("cache"), 0.75)
+
+    def test_reset(self):
+        with self.recorder.span("span"):
+            self.recorder.count("counter")
+        self.recorder.reset()
+        self.assertEqual(self.recorder.snapshot(), ([], {}))
+
+    def test_chrome_trace(self):
+        with self.recorder.span("span"):
+            self.recorder.count("counter")
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "trace.json"
+            self.recorder.dump_chrome_trace(path)
+            trace = json.loads(path.read_text(encoding="utf-8"))
+
+        (event,) = trace["traceEvents"]
+        self.assertEqual(event["name"], "span")
+        self.assertEqual(event["ph"], "X")
+        self.assertEqual(event["args"], {"counter": 1})
+        self.assertGreaterEqual(event["dur"], 0)
+        self.assertEqual(trace["otherData"]["counters"], {"counter": 1})
+
+
+class Diagnostics(QtTestCase):
+    def test_refresh(self):
+        recorder = Recorder()
+        recorder.enabled = True
+        nm = self.note_manager()
+        nm.new_note(title="note", content="<p>content</p>")
+        with recorder.span("sync.update"):
+            recorder.count("api.requests", 3)
+        recorder.count("render_cache.hit")
+
+        window = DiagnosticsWindow(nm, recorder)
+        self.assertEqual(window.span_table.rowCount(), 1)
+        self.assertEqual(window.span_table.item(0, 0).text(), "sync.update")
+        self.assertEqual(window.counter_table.rowCount(), 2)
+        self.assertEqual(window.window_table.item(0, 0).text(), "note")
+        self.assertIn("Requests per sync: 3.0", window.summary_label.text())
+        self.assertIn("render cache 100%", window.summary_label.text())
+
+        window.enabled_check.setChecked(False)
+        self.assertFalse(recorder.enabled)
+        window.reset_button.click()
+        self.assertEqual(window.span_table.rowCount(), 0)
+        window.close()
+
+
+class Startup(unittest.TestCase):
+    def test_profile(self):
+        times = iter([1.0, 1.5, 1.75])
+        profile = StartupProfile(start=0.5, clock=lambda: next(times))
+        profile.mark("imports")
+        profile.mark("qt")
+        profile.mark("tray")
+        self.assertEqual(
+            profile.phases, [("imports", 0.5), ("qt", 0.5), ("tray", 0.25)]
+        )
+        self.assertIn("total", profile.report())
+        self.assertIn("1250.0 ms", profile.report())
+
+    def test_lazy_imports(self):
+        # The HTTP stack and Markdown aren't needed to show the tray.
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, joplin_sticky_notes.app; "
+                "modules = {'requests', 'joppy.api', 'markdown'}; "
+                "print(sorted(modules & set(sys.modules)))",
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
@@ -0,0 +1,126 @@
+import unittest
+
+import joppy.data_types as dt
+from PySide6.QtCore import QItemSelectionModel, QModelIndex, Qt
+from PySide6.QtWidgets import QApplication
+
+from joplin_sticky_notes.api_helper import build_hierarchy
+from joplin_sticky_notes.hierarchy_cache import TitleIndex
+from joplin_sticky_notes.note_selection import (
+    HierarchyModel,
+    MultiNoteSelection,
+    SearchModel,
+)
+
+
+def id_(number):
+    return f"{number:032x}"
+
+
+NOTEBOOKS = [
+    dt.NotebookData(id=id_(1), title="work", parent_id=""),
+    dt.NotebookData(id=id_(2), title="archive", parent_id=id_(1)),
+]
+NOTES = [
+    dt.NoteData(id=id_(10), title="Shopping List", parent_id=id_(1)),
+    dt.NoteData(id=id_(11), title="meeting notes", parent_id=id_(1)),
+    dt.NoteData(id=id_(12), title="Old shopping", parent_id=id_(2)),
+]
+
+
+class NoteSelectionModels(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_hierarchy_model(self):
+        model = HierarchyModel(build_hierarchy(NOTEBOOKS, NOTES))
+        self.assertEqual(model.rowCount(), 1)
+        work = model.index(0, 0)
+        self.assertEqual(work.data(), "work")
+        self.assertIsNone(work.data(Qt.UserRole))
+
+        # Notebooks first, then the notes sorted by title.
+        children = [model.index(row, 0, work) for row in range(model.rowCount(work))]
+        self.assertEqual(
+            [child.data() for child in children],
+            ["archive", "Shopping List", "meeting notes"],
+        )
+        self.assertEqual(children[1].data(Qt.UserRole), id_(10))
+        self.assertEqual(model.parent(children[1]), work)
+        self.assertEqual(model.parent(work), QModelIndex())
+
+        old_shopping = model.index(0, 0, children[0])
+        self.assertEqual(old_shopping.data(), "Old shopping")
+        self.assertEqual(model.parent(old_shopping), children[0])
+        self.assertEqual(model.rowCount(old_shopping), 0)
+
+    def test_search(self):
+        model = SearchModel(TitleIndex(NOTES))
+        model.search("SHOP")
+        self.assertEqual(
+            [model.index(row).data() for row in range(model.rowCount())],
+            ["Old shopping", "Shopping List"],
+        )
+        model.search("list shop")
+        self.assertEqual(model.rowCount(), 1)
+        self.assertEqual(model.index(0).data(Qt.UserRole), id_(10))
+        model.search("missing")
+        self.assertEqual(model.rowCount(), 0)
+
+
+class MultipleNotes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.choices = []
+        self.selection = MultiNoteSelection(
+            build_hierarchy(NOTEBOOKS, NOTES),
+            TitleIndex(NOTES),
+            None,
+            self.choices.append,
+        )
+
+    def tearDown(self):
+        self.selection.close()
+
+    def select(self, index):
+        self.selection.view.selectionModel().select(
+            index,
+            QItemSelectionModel.SelectionFlag.Select
+            | QItemSelectionModel.SelectionFlag.Rows,
+        )
+
+    def test_notebook_and_note(self):
+        model = self.selection.hierarchy_model
+        work = model.index(0, 0)
+        archive = model.index(0, 0, work)
+        self.select(archive)
+        # Already included by the notebook.
+        self.select(model.index(0, 0, archive))
+        self.select(model.index(2, 0, work))
+
+        self.selection.buttons.accepted.emit()
+        (choice,) = self.choices
+        self.assertEqual([note.id for note in choice.notes], [id_(12), id_(11)])
+        self.assertEqual(choice.notebook_ids, [id_(2)])
+        self.assertIsNone(choice.tag_id)
+
+    def test_search_result_by_return(self):
+        self.selection.search_edit.setText("shopping list")
+        self.selection.on_return_pressed()
+        (choice,) = self.choices
+        self.assertEqual([note.id for note in choice.notes], [id_(10)])
+
+    def test_tag(self):
+        self.selection.set_tags([dt.TagData(id=id_(20), title="today")])
+        self.assertTrue(self.selection.tag_box.isEnabled())
+        self.selection.on_tag_activated(1)
+        (choice,) = self.choices
+        self.assertEqual((choice.notes, choice.tag_id), ([], id_(20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
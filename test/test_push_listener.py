@@ -0,0 +1,57 @@
+import time
+
+import requests
+
+from joplin_sticky_notes.push_listener import PushListener
+from test.test_basic import QtTestCase
+
+
+class Push(QtTestCase):
+    def setUp(self):
+        super().setUp()
+        # Use any free port.
+        self.listener = PushListener(port=0, token="secret")
+        self.assertTrue(self.listener.start())
+        self.url = f"http://127.0.0.1:{self.listener.port}/notes"
+        self.changes = []
+        self.listener.notes_changed.connect(self.changes.append)
+
+    def tearDown(self):
+        self.listener.stop()
+        super().tearDown()
+
+    def send(self, data, token="secret"):
+        """Stub of the Joplin plugin."""
+        return requests.post(
+            self.url,
+            json=data,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=5,
+        )
+
+    def wait_for_changes(self):
+        deadline = time.monotonic() + 5
+        while not self.changes and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def test_notes_changed(self):
+        response = self.send({"ids": ["a" * 32, "b" * 32]})
+        self.assertEqual(response.status_code, 204)
+        self.wait_for_changes()
+        self.assertEqual(self.changes, [{"a" * 32, "b" * 32}])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.send({"ids": ["a" * 32]}, token="wrong").status_code, 401)
+        self.assertEqual(self.send({"ids": "a"}).status_code, 400)
+        self.assertEqual(self.send(["a"]).status_code, 400)
+        self.assertEqual(
+            requests.post(self.url[: -len("notes")] + "other", timeout=5).status_code,
+            404,
+        )
+        self.app.processEvents()
+        self.assertEqual(self.changes, [])
+
+    def test_port_in_use(self):
+        listener = PushListener(port=self.listener.port)
+        self.assertFalse(listener.start())
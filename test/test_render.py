@@ -0,0 +1,43 @@
+import unittest
+
+from joplin_sticky_notes.api_helper import NoteBody, replace_resource_links
+from joplin_sticky_notes.render import link_images, Renderer
+
+
+class Rendering(unittest.TestCase):
+    def test_replace_resource_links(self):
+        id_1 = "1" * 32
+        id_2 = "2" * 32
+        body = f"![image](:/{id_1}) [pdf](:/{id_2}) [other](:/{'3' * 32})"
+        self.assertEqual(
+            replace_resource_links(body, {id_1: "/a", id_2: "/b"}),
+            f"![image](/a) [pdf](/b) [other](:/{'3' * 32})",
+        )
+
+    def test_link_images(self):
+        self.assertEqual(
+            link_images('<p><img alt="a" src="/b" /></p>'),
+            '<p><a href="/b"><img alt="a" src="/b" /></a></p>',
+        )
+        linked = '<a href="/c"><img src="/b" /></a>'
+        self.assertEqual(link_images(linked), linked)
+
+    def test_cache(self):
+        renderer = Renderer(max_size=2)
+        calls = []
+        convert = renderer.markdown().convert
+        renderer.md.convert = lambda text: calls.append(text) or convert(text)
+
+        html = renderer.render(NoteBody("**bold**", "v1"))
+        self.assertEqual(html, "<p><strong>bold</strong></p>")
+        renderer.render(NoteBody("**bold**", "v1"))
+        self.assertEqual(len(calls), 1)
+
+        # A changed resource invalidates the cache entry.
+        renderer.render(NoteBody("**bold**", "v2"))
+        self.assertEqual(len(calls), 2)
+
+        # The least recently used entry is removed.
+        renderer.render(NoteBody("other", "v1"))
+        self.assertEqual(len(renderer.cache), 2)
+        self.assertNotIn(renderer.key(NoteBody("**bold**", "v1")), renderer.cache)
@@ -0,0 +1,158 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import tempfile
+import threading
+import unittest
+
+import joppy.data_types as dt
+
+from joplin_sticky_notes.resource_cache import ResourceCache
+
+
+def id_(number):
+    return f"{number:032x}"
+
+
+def resource(number, updated_time=1700000000000):
+    return dt.ResourceData(id=id_(number), blob_updated_time=updated_time)
+
+
+class FakeResourceApi(ThreadingHTTPServer):
+    """Serves resource files with 10 bytes."""
+
+    def __init__(self):
+        self.downloads = []
+
+        downloads = self.downloads
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                # /resources/<id>/file?token=...
+                downloads.append(self.path.split("/")[2])
+                self.send_response(200)
+                self.send_header("Content-Length", "10")
+                self.end_headers()
+                self.wfile.write(b"x" * 10)
+
+            def log_message(self, *_):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.token = "token"
+        threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True).start()
+
+
+class Resources(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name)
+        self.api = FakeResourceApi()
+
+    def tearDown(self):
+        self.api.shutdown()
+        self.api.server_close()
+        self.folder.cleanup()
+
+    def test_download_only_changed(self):
+        cache = ResourceCache(self.path)
+        file_ = cache.get(self.api, resource(1))
+        self.assertEqual(file_, self.path / id_(1))
+        self.assertEqual(file_.read_bytes(), b"x" * 10)
+
+        cache.get(self.api, resource(1))
+        self.assertEqual(self.api.downloads, [id_(1)])
+
+        # The index is persisted.
+        cache.save()
+        cache = ResourceCache(self.path)
+        cache.get(self.api, resource(1))
+        self.assertEqual(self.api.downloads, [id_(1)])
+
+        cache.get(self.api, resource(1, updated_time=1800000000000))
+        self.assertEqual(self.api.downloads, [id_(1)] * 2)
+
+    def test_lru_eviction(self):
+        cache = ResourceCache(self.path, max_bytes=25)
+        for number in range(3):
+            cache.get(self.api, resource(number))
+        cache.get(self.api, resource(0))  # mark as recently used
+        cache.evict()
+
+        self.assertEqual(cache.size, 20)
+        self.assertEqual(set(cache.resources), {id_(0), id_(2)})
+        self.assertFalse((self.path / id_(1)).exists())
+
+    def test_eviction_keeps_open_notes(self):
+        cache = ResourceCache(self.path, max_bytes=15)
+        for number in range(3):
+            cache.get(self.api, resource(number))
+        cache.set_note_resources("note", [id_(0), id_(1)])
+        cache.set_open_notes(["note"])
+        cache.evict()
+
+        self.assertEqual(set(cache.resources), {id_(0), id_(1)})
+
+    def test_garbage_collection(self):
+        cache = ResourceCache(self.path)
+        for number in range(3):
+            cache.get(self.api, resource(number))
+        (self.path / "unknown").write_bytes(b"")
+        cache.set_note_resources("open note", [id_(0)])
+        cache.set_note_resources("closed note", [id_(1)])
+        cache.set_open_notes(["open note"])
+        cache.collect_garbage()
+
+        self.assertEqual(set(cache.resources), {id_(0)})
+        self.assertEqual(
+            sorted(file_.name for file_ in self.path.iterdir()),
+            [id_(0), "index.json"],
+        )
+        self.assertEqual(cache.note_resources, {"open note": [id_(0)]})
+
+    def test_garbage_collection_unknown_notes(self):
+        cache = ResourceCache(self.path)
+        cache.get(self.api, resource(0))
+        cache.set_open_notes(["note without index"])
+        cache.collect_garbage()
+
+        self.assertTrue((self.path / id_(0)).exists())
+
+    def test_concurrent_downloads(self):
+        cache = ResourceCache(self.path)
+        cache.get(self.api, resource(0))
+        progress = []
+        cache.get_all(
+            self.api,
+            [resource(number) for number in range(5)],
+            lambda downloaded, total: progress.append((downloaded, total)),
+        )
+
+        self.assertEqual(
+            sorted(self.api.downloads), [id_(number) for number in range(5)]
+        )
+        self.assertEqual(progress, [(number, 4) for number in range(5)])
+        self.assertFalse(list(self.path.glob("*.part")))
+
+    def test_shared_resource_downloaded_once(self):
+        cache = ResourceCache(self.path)
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def get():
+            barrier.wait()
+            try:
+                cache.get(self.api, resource(0))
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors.append(error)
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.api.downloads, [id_(0)])
+        self.assertEqual(cache.downloads, {})
+        self.assertEqual((self.path / id_(0)).read_bytes(), b"x" * 10)
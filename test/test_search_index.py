@@ -0,0 +1,79 @@
+from pathlib import Path
+import tempfile
+import threading
+import unittest
+
+import joppy.data_types as dt
+
+from joplin_sticky_notes.search_index import SearchIndex, to_query
+
+
+def id_(number):
+    return f"{number:032x}"
+
+
+class Index(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(Path(self.folder.name) / "search.sqlite")
+
+    def tearDown(self):
+        self.index.close()
+        self.folder.cleanup()
+
+    def search_ids(self, text):
+        return [note.id for note in self.index.search(text)]
+
+    def test_query(self):
+        self.assertEqual(to_query(""), "")
+        self.assertEqual(to_query('shop "list'), '"shop" """list"*')
+
+    def test_search(self):
+        self.assertIsNone(self.index.cursor)
+        self.index.update(
+            "1",
+            [
+                dt.NoteData(id=id_(1), title="Groceries", body="milk and bread"),
+                dt.NoteData(id=id_(2), title="Bread recipe", body="flour, water"),
+                dt.NoteData(id=id_(3), title="Café", body=None),
+            ],
+        )
+        self.assertEqual(self.index.cursor, "1")
+
+        # Title matches rank higher than body matches.
+        self.assertEqual(self.search_ids("bread"), [id_(2), id_(1)])
+        self.assertEqual(self.search_ids("milk bre"), [id_(1)])
+        self.assertEqual(self.search_ids("cafe"), [id_(3)])
+        self.assertEqual(self.search_ids('"('), [])
+        self.assertEqual(self.index.search("groceries")[0].title, "Groceries")
+
+    def test_incremental_update(self):
+        self.index.update("1", [dt.NoteData(id=id_(1), title="old", body="")])
+        self.index.update(
+            "2",
+            [dt.NoteData(id=id_(2), title="new", body="")],
+            deleted_ids=[id_(1)],
+        )
+        self.index.update("3", [dt.NoteData(id=id_(2), title="renamed", body="")])
+        self.assertEqual(self.search_ids("old"), [])
+        self.assertEqual(self.search_ids("new"), [])
+        self.assertEqual(self.search_ids("renamed"), [id_(2)])
+
+        self.index.update("4", [dt.NoteData(id=id_(3), title="reset")], reset=True)
+        self.assertEqual(self.search_ids("renamed"), [])
+        self.assertEqual(self.search_ids("reset"), [id_(3)])
+        self.assertEqual(self.index.cursor, "4")
+
+    def test_search_from_other_thread(self):
+        self.index.update("1", [dt.NoteData(id=id_(1), title="title", body="")])
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(self.search_ids("title"))
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(results, [[id_(1)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
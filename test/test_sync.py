@@ -0,0 +1,84 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+import joppy.data_types as dt
+import requests
+
+from joplin_sticky_notes.resource_cache import ResourceCache
+from joplin_sticky_notes.sync import get_changes, get_updated_notes
+
+
+NOTE_ID_1 = "1" * 32
+NOTE_ID_2 = "2" * 32
+
+
+class FakeEventApi:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested_cursors = []
+
+    def get_events(self, cursor=None):
+        self.requested_cursors.append(cursor)
+        if cursor is None:
+            return dt.DataList(has_more=False, cursor=len(self.pages))
+        return self.pages[int(cursor)]
+
+
+class FakeNoteApi(FakeEventApi):
+    def __init__(self, pages, deleted_ids):
+        super().__init__(pages)
+        self.deleted_ids = deleted_ids
+
+    def get_note(self, id_, **_):
+        if id_ in self.deleted_ids:
+            raise requests.exceptions.HTTPError("404 Client Error: Not Found")
+        return dt.NoteData(title="title", body="body")
+
+    def get_all_resources(self, **_):
+        return []
+
+
+def event(item_id, type_, item_type=dt.ItemType.NOTE.value):
+    return dt.EventData(item_type=item_type, item_id=item_id, type=type_)
+
+
+class Changes(unittest.TestCase):
+    def test_no_cursor(self):
+        api = FakeEventApi([])
+        cursor, updated_ids, deleted_ids = get_changes(api, None)
+        self.assertEqual(cursor, "0")
+        self.assertEqual(updated_ids, set())
+        self.assertEqual(deleted_ids, set())
+
+    def test_pages(self):
+        pages = [
+            dt.DataList(
+                has_more=True,
+                cursor=1,
+                items=[event(NOTE_ID_1, 2), event(NOTE_ID_2, 1)],
+            ),
+            dt.DataList(
+                has_more=False,
+                cursor=2,
+                items=[event(NOTE_ID_2, 3), event("3" * 32, 2, item_type=2)],
+            ),
+        ]
+        api = FakeEventApi(pages)
+        cursor, updated_ids, deleted_ids = get_changes(api, "0")
+        self.assertEqual(cursor, "2")
+        self.assertEqual(updated_ids, {NOTE_ID_1})
+        self.assertEqual(deleted_ids, {NOTE_ID_2})
+        self.assertEqual(api.requested_cursors, ["0", "1"])
+
+
+class UpdatedNotes(unittest.TestCase):
+    def test_deleted_note_skipped(self):
+        api = FakeNoteApi([], deleted_ids={NOTE_ID_2})
+        with tempfile.TemporaryDirectory() as folder:
+            cursor, notes = get_updated_notes(
+                api, None, {NOTE_ID_1, NOTE_ID_2}, ResourceCache(Path(folder))
+            )
+        # The cursor is returned, so that the next update is incremental.
+        self.assertEqual(cursor, "0")
+        self.assertEqual(list(notes), [NOTE_ID_1])
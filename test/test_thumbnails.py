@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage
+
+from joplin_sticky_notes.document_patch import patch_document
+from joplin_sticky_notes.thumbnails import bucket, ImageBrowser, ThumbnailCache
+
+from .test_basic import QtTestCase
+
+
+def save_image(file_, width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(Qt.red)
+    image.save(str(file_), "PNG")
+
+
+class Thumbnails(QtTestCase):
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.TemporaryDirectory()
+        self.resources = Path(self.folder.name) / "resources"
+        self.resources.mkdir()
+        self.thumbnails = ThumbnailCache(
+            Path(self.folder.name) / "thumbnails", self.resources
+        )
+
+    def tearDown(self):
+        self.folder.cleanup()
+        super().tearDown()
+
+    def test_bucket(self):
+        self.assertEqual(bucket(400), 384)
+        self.assertEqual(bucket(400, 2.0), 768)
+        self.assertEqual(bucket(10), 128)
+
+    def test_downscaled_and_stored(self):
+        save_image(self.resources / "large", 2000, 1000)
+        image = self.thumbnails.get(self.resources / "large", 512)
+        self.assertEqual((image.width(), image.height()), (512, 256))
+        (thumbnail,) = self.thumbnails.path.iterdir()
+
+        # The stored thumbnail is used the next time.
+        os.utime(thumbnail, (0, 0))
+        self.thumbnails.get(self.resources / "large", 512)
+        self.assertEqual(thumbnail.stat().st_mtime, 0)
+
+    def test_not_downscaled(self):
+        save_image(self.resources / "small", 100, 100)
+        (self.resources / "text").write_text("no image")
+        self.assertIsNone(self.thumbnails.get(self.resources / "small", 512))
+        self.assertIsNone(self.thumbnails.get(self.resources / "text", 512))
+        self.assertEqual(list(self.thumbnails.path.iterdir()), [])
+
+    def test_collect_garbage(self):
+        for name in ("kept", "changed", "removed"):
+            save_image(self.resources / name, 1000, 1000)
+            self.thumbnails.get(self.resources / name, 256)
+        os.utime(self.resources / "changed", (0, 0))
+        (self.resources / "removed").unlink()
+
+        self.thumbnails.collect_garbage()
+        (thumbnail,) = self.thumbnails.path.iterdir()
+        self.assertTrue(thumbnail.name.startswith("kept-"))
+
+    def test_browser_fits_width(self):
+        save_image(self.resources / "large", 3000, 1500)
+        browser = ImageBrowser(self.thumbnails)
+        browser.resize(400, 300)
+        browser.show()
+        browser.setHtml(f'<img src="{self.resources / "large"}">')
+        self.app.processEvents()
+        self.assertLessEqual(
+            browser.document().size().width(), browser.viewport().width()
+        )
+        small_width = browser.image_width
+
+        # Larger thumbnails after resizing.
+        browser.resize(900, 300)
+        self.app.processEvents()
+        self.assertGreater(browser.image_width, small_width)
+        self.assertGreater(browser.document().size().width(), small_width)
+        self.assertLessEqual(
+            browser.document().size().width(), browser.viewport().width()
+        )
+        browser.deleteLater()
+
+    def test_removed_images_not_reloaded(self):
+        save_image(self.resources / "image", 1000, 1000)
+        browser = ImageBrowser(self.thumbnails)
+        image_html = f'<p>text</p><p><img src="{self.resources / "image"}"></p>'
+        browser.setHtml(image_html)
+        self.assertEqual(browser.image_urls(), {str(self.resources / "image")})
+
+        # Only the image block is removed.
+        self.assertTrue(patch_document(browser.document(), "<p>text</p>"))
+        self.assertEqual(browser.image_urls(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
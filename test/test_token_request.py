@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from joplin_sticky_notes.token_request import TokenRequest, TokenState
+from joplin_sticky_notes.worker import Worker
+from test.test_basic import QtTestCase
+
+
+class FakeAuthServer(ThreadingHTTPServer):
+    """Accepts or rejects a token request after the status was checked twice."""
+
+    def __init__(self, status="accepted"):
+        self.checks = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                self.send_json({"auth_token": "auth"})
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                server.checks += 1
+                if server.checks < 3:
+                    self.send_json({"status": "waiting"})
+                else:
+                    self.send_json({"status": status, "token": "api token"})
+
+            def log_message(self, *_):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True).start()
+
+
+class Authorization(QtTestCase):
+    def request_token(self, url, **kwargs):
+        request = TokenRequest(Worker(), url=url, poll_interval=10, **kwargs)
+        states = []
+        results = []
+        request.state_changed.connect(states.append)
+        request.accepted.connect(results.append)
+        request.failed.connect(results.append)
+        request.start()
+        # The event loop keeps running while waiting for the token.
+        deadline = time.monotonic() + 5
+        while not results and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        return request, states, results
+
+    def test_accepted(self):
+        server = FakeAuthServer()
+        try:
+            request, states, results = self.request_token(server.url)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(results, ["api token"])
+        self.assertEqual(request.polls, 3)
+        self.assertEqual(
+            states,
+            [TokenState.REQUESTING, TokenState.WAITING, TokenState.ACCEPTED],
+        )
+
+    def test_rejected(self):
+        server = FakeAuthServer("rejected")
+        try:
+            request, _, results = self.request_token(server.url)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(results, ["The request was rejected in Joplin."])
+        self.assertEqual(request.state, TokenState.FAILED)
+
+    def test_timeout(self):
+        server = FakeAuthServer()
+        try:
+            _, _, results = self.request_token(server.url, max_polls=2)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(results, ["The request wasn't accepted in time."])
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from joplin_sticky_notes.worker import Worker
+from test.test_basic import QtTestCase
+
+
+class Background(QtTestCase):
+    def wait(self, worker):
+        worker.pool.waitForDone()
+        self.app.processEvents()
+
+    def test_result_in_gui_thread(self):
+        worker = Worker()
+        results = []
+        worker.submit(
+            "key",
+            threading.get_ident,
+            on_result=lambda result: results.append((result, threading.get_ident())),
+        )
+        self.wait(worker)
+
+        self.assertEqual(len(results), 1)
+        worker_thread, callback_thread = results[0]
+        self.assertNotEqual(worker_thread, threading.get_ident())
+        self.assertEqual(callback_thread, threading.get_ident())
+        self.assertFalse(worker.is_running("key"))
+
+    def test_deduplication(self):
+        worker = Worker()
+        calls = []
+        results = []
+
+        def function():
+            calls.append(None)
+            time.sleep(0.1)
+            return "result"
+
+        for _ in range(3):
+            worker.submit("key", function, on_result=results.append)
+        self.wait(worker)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 3)
+
+    def test_cancel(self):
+        worker = Worker()
+        results = []
+        worker.submit("key", time.sleep, 0.1, on_result=results.append)
+        worker.cancel("key")
+        self.wait(worker)
+
+        self.assertEqual(results, [])
+        self.assertFalse(worker.is_running("key"))
+
+    def test_error(self):
+        worker = Worker()
+        errors = []
+        worker.submit("key", int, "no int", on_error=errors.append)
+        self.wait(worker)
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ValueError)